@@ -0,0 +1,327 @@
+import sys
+import time
+import base64
+import socket
+import logging
+import asyncore
+import urlparse
+import collections
+import util
+import dispatch
+import ratelimit
+from settings import settings
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+    
+MAX_REDIRECTS = 5
+READ_SIZE = 8192
+
+def is_supported():
+    # proxies are only handled by the urllib2 based fetcher
+    return not settings.USE_PROXY
+    
+def build_headers(username=None, password=None, etag=None, modified=None):
+    headers = {
+        'User-Agent': settings.USER_AGENT,
+        'Accept-Encoding': util.get_accept_encoding(),
+        'Connection': 'close',
+    }
+    if username and password:
+        credentials = base64.b64encode('%s:%s' % (username, password))
+        headers['Authorization'] = 'Basic %s' % credentials
+    if etag:
+        headers['If-None-Match'] = etag
+    if modified:
+        headers['If-Modified-Since'] = modified
+    return headers
+    
+class Response(object):
+    def __init__(self, url, status=0, headers=None, data='', error=None, redirects=None, transferred=0, elapsed=0, skipped=False):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self.data = data
+        self.error = error
+        self.redirects = redirects or []
+        self.transferred = transferred
+        self.elapsed = elapsed
+        self.skipped = skipped
+    def parse(self, digest=None, is_known=None):
+        if self.error:
+            raise self.error
+        return util.parse_data(self.data, self.url, self.status, self.headers, digest, is_known, self.redirects, self.transferred)
+        
+class Request(asyncore.dispatcher):
+    def __init__(self, engine, host, key, url, headers, redirects=(), max_size=None, limits=None, cycle_deadline=None):
+        asyncore.dispatcher.__init__(self, map=engine.map)
+        self.engine = engine
+        self.dispatch_host = host
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.redirects = redirects
+        self.max_size = max_size
+        self.incoming = []
+        self.received = 0
+        self.started = time.time()
+        # the total time allowed counts from here, not from when the job was queued
+        self.connect_timeout, self.read_timeout, total = limits or util.get_default_limits()
+        self.cycle_deadline = cycle_deadline
+        self.deadline = self.started + total
+        if cycle_deadline:
+            self.deadline = min(self.deadline, cycle_deadline)
+        self.handshaking = False
+        self.finished = False
+        self.last_activity = time.time()
+        parts = urlparse.urlsplit(url)
+        self.secure = parts.scheme == 'https'
+        if parts.scheme not in ('http', 'https'):
+            raise IOError('Unsupported URL scheme: %s' % parts.scheme)
+        if self.secure and ssl is None:
+            raise IOError('SSL is not available')
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+        host = self.host
+        if parts.port:
+            host = '%s:%d' % (host, parts.port)
+        lines = ['GET %s HTTP/1.0' % path, 'Host: %s' % host]
+        lines.extend('%s: %s' % pair for pair in sorted(headers.iteritems()))
+        self.outgoing = '\r\n'.join(lines) + '\r\n\r\n'
+    def __hash__(self):
+        # dispatchers forward unknown attributes to their socket, which
+        # would change the hash once the socket is created
+        return id(self)
+    def open(self, info):
+        # called by the engine once the host name is resolved
+        family, type, proto, name, address = info
+        self.create_socket(family, type)
+        self.connect(address)
+    def readable(self):
+        return not self.finished and not self.throttled()
+    def throttled(self):
+        # stop reading while over the bandwidth budget, tcp flow control
+        # then slows the server down
+        return self.connected and not self.handshaking and not ratelimit.bytes_available()
+    def writable(self):
+        return not self.connected or self.handshaking or bool(self.outgoing)
+    def handle_connect(self):
+        self.last_activity = time.time()
+        if self.secure:
+            context = ssl.create_default_context()
+            sock = context.wrap_socket(self.socket, server_hostname=self.host, do_handshake_on_connect=False)
+            self.del_channel()
+            self.set_socket(sock)
+            self.handshaking = True
+            self.do_handshake()
+    def do_handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError, e:
+            if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                return
+            raise
+        self.handshaking = False
+    def handle_write(self):
+        self.last_activity = time.time()
+        if self.handshaking:
+            self.do_handshake()
+            return
+        try:
+            sent = self.send(self.outgoing)
+        except socket.error, e:
+            if ssl and isinstance(e, ssl.SSLError) and e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                return
+            raise
+        self.outgoing = self.outgoing[sent:]
+    def handle_read(self):
+        self.last_activity = time.time()
+        if self.handshaking:
+            self.do_handshake()
+            return
+        while True:
+            try:
+                data = self.recv(READ_SIZE)
+            except socket.error, e:
+                if ssl and isinstance(e, ssl.SSLError) and e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    return
+                raise
+            if not data:
+                return
+            self.incoming.append(data)
+            self.received += len(data)
+            ratelimit.consume_bytes(len(data))
+            if self.max_size and self.received > self.max_size:
+                self.fail(util.ResponseTooLarge('Response larger than %d bytes' % self.max_size))
+                return
+            if not (self.secure and self.socket.pending()):
+                return
+    def handle_close(self):
+        if not self.finished:
+            self.finish()
+        self.close()
+    def handle_error(self):
+        error = sys.exc_info()[1] or socket.error('Error fetching %s' % self.url)
+        self.fail(error)
+    def handle_expt(self):
+        self.fail(socket.error('Connection failed: %s' % self.url))
+    def check_timeout(self, now):
+        if now > self.deadline:
+            return 'Request deadline exceeded'
+        if not self.connected and now - self.started > self.connect_timeout:
+            return 'Connect timed out'
+        if self.throttled():
+            self.last_activity = now
+        if now - self.last_activity > self.read_timeout:
+            return 'Read timed out'
+        return None
+    def fail(self, error):
+        if not self.finished:
+            self.finished = True
+            self.engine.complete(self.key, Response(self.url, error=error))
+        self.close()
+    def close(self):
+        if self.socket is not None:
+            asyncore.dispatcher.close(self)
+        if self in self.engine.active:
+            self.engine.active.remove(self)
+            self.engine.pending.done(self.dispatch_host)
+    def finish(self):
+        self.finished = True
+        data = ''.join(self.incoming)
+        head, separator, body = data.partition('\r\n\r\n')
+        if not separator:
+            error = socket.error('Incomplete response: %s' % self.url)
+            self.engine.complete(self.key, Response(self.url, error=error))
+            return
+        lines = head.split('\r\n')
+        try:
+            status = int(lines[0].split()[1])
+        except Exception:
+            error = socket.error('Invalid status line: %s' % self.url)
+            self.engine.complete(self.key, Response(self.url, error=error))
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(':')
+            if separator:
+                headers[name.strip().lower()] = value.strip()
+        location = headers.get('location')
+        if status in (301, 302, 303, 307, 308) and location:
+            if len(self.redirects) < MAX_REDIRECTS:
+                url = urlparse.urljoin(self.url, location)
+                expiry = util.get_header_expiry(status, headers, int(time.time()))
+                redirects = self.redirects + ((status, url, expiry),)
+                limits = (self.connect_timeout, self.read_timeout, max(0, self.deadline - time.time()))
+                self.engine.redirect(self.key, url, self.headers, redirects, self.max_size, limits, self.cycle_deadline)
+                return
+        encoding = headers.pop('content-encoding', '').lower()
+        transferred = len(body)
+        try:
+            body = util.decompress(body, encoding, self.max_size)
+        except Exception, e:
+            self.engine.complete(self.key, Response(self.url, error=e))
+            return
+        self.engine.complete(self.key, Response(self.url, status, headers, body, redirects=list(self.redirects), transferred=transferred, elapsed=time.time() - self.started))
+        
+class Engine(object):
+    def __init__(self, max_connections=None):
+        self.max_connections = max_connections or settings.ASYNC_MAX_CONNECTIONS
+        self.map = {}
+        self.pending = dispatch.HostQueue()
+        self.active = set()
+        self.results = collections.deque()
+        self.priorities = {}
+        self.addresses = {}
+        self.lookups = {}
+        self.resolved = collections.deque()
+    def add(self, key, url, username=None, password=None, etag=None, modified=None, max_size=None, limits=None, priority=0, deadline=None):
+        # limits are (connect, read, total) in seconds, deadline ends the poll cycle
+        headers = build_headers(username, password, etag, modified)
+        self.priorities[key] = priority
+        self.pending.put(url, (key, url, headers, (), max_size or settings.MAX_RESPONSE_SIZE, limits, deadline), priority)
+    def redirect(self, key, url, headers, redirects, max_size=None, limits=None, deadline=None):
+        logging.info('Following redirect to "%s"' % url)
+        self.pending.put(url, (key, url, headers, redirects, max_size, limits, deadline), self.priorities.get(key, 0))
+    def complete(self, key, response):
+        self.results.append((key, response))
+    def start(self):
+        while self.pending and len(self.active) < self.max_connections:
+            if not ratelimit.request_available():
+                break
+            host, job = self.pending.get(False)
+            if job is None:
+                break
+            key, url, headers, redirects, max_size, limits, deadline = job
+            if deadline and time.time() > deadline:
+                # the poll cycle ran out of time before this request started
+                self.pending.done(host)
+                self.complete(key, Response(url, skipped=True))
+                continue
+            ratelimit.consume_request()
+            try:
+                request = Request(self, host, key, url, headers, redirects, max_size, limits, deadline)
+            except Exception, e:
+                self.pending.done(host)
+                self.complete(key, Response(url, error=e))
+                continue
+            self.active.add(request)
+            self.resolve(request)
+    def resolve(self, request):
+        key = (request.host, request.port)
+        if key in self.addresses:
+            self.open(request, self.addresses[key])
+            return
+        if key not in self.lookups:
+            self.lookups[key] = []
+            util.start_thread(self.lookup, key)
+        self.lookups[key].append(request)
+    def lookup(self, key):
+        # runs on a helper thread, a slow name server must not stall the loop
+        try:
+            info = socket.getaddrinfo(key[0], key[1], 0, socket.SOCK_STREAM)[0]
+            self.resolved.append((key, info, None))
+        except Exception, e:
+            self.resolved.append((key, None, e))
+    def open_resolved(self):
+        while self.resolved:
+            key, info, error = self.resolved.popleft()
+            if info:
+                self.addresses[key] = info
+            for request in self.lookups.pop(key, []):
+                if request.finished:
+                    continue
+                if error:
+                    request.fail(error)
+                else:
+                    self.open(request, info)
+    def open(self, request, info):
+        try:
+            request.open(info)
+        except Exception, e:
+            request.fail(e)
+    def check_timeouts(self):
+        now = time.time()
+        for request in list(self.active):
+            error = request.check_timeout(now)
+            if error:
+                request.fail(socket.timeout('%s: %s' % (error, request.url)))
+    def run(self):
+        while self.pending or self.active or self.results:
+            self.start()
+            self.open_resolved()
+            if self.map:
+                asyncore.loop(timeout=0.25, map=self.map, count=1)
+            elif self.active or self.pending and not self.results:
+                # waiting on host name lookups, per-host politeness delays
+                # or the request budget
+                time.sleep(0.1)
+            self.check_timeouts()
+            while self.results:
+                yield self.results.popleft()
+                
\ No newline at end of file
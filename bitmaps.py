@@ -0,0 +1,63 @@
+import os
+import wx
+import threading
+import collections
+import util
+from settings import settings
+
+class BitmapCache(object):
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.bitmaps = collections.OrderedDict()
+    def get(self, path, width=-1, height=-1, color=None):
+        # returns None for images that are missing or fail to load, those
+        # are remembered too so a popup never has to look for them again
+        path = os.path.abspath(path)
+        key = (path, width, height, color)
+        with self.lock:
+            if key in self.bitmaps:
+                bitmap = self.bitmaps.pop(key)
+                self.bitmaps[key] = bitmap
+                return bitmap
+        bitmap = self.load(path, width, height, color)
+        with self.lock:
+            self.bitmaps[key] = bitmap
+            while len(self.bitmaps) > self.size:
+                self.bitmaps.popitem(False)
+        return bitmap
+    def load(self, path, width, height, color):
+        if not os.path.exists(path):
+            return None
+        try:
+            bitmap = wx.Bitmap(path)
+            if not bitmap.IsOk():
+                return None
+            if color is not None:
+                bitmap = util.scale_bitmap(bitmap, width, height, wx.Colour(*color))
+            return bitmap
+        except Exception:
+            return None
+    def invalidate(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            for key in self.bitmaps.keys():
+                if key[0] == path:
+                    del self.bitmaps[key]
+                    
+lock = threading.Lock()
+cache = None
+
+def get_cache():
+    global cache
+    with lock:
+        if cache is None:
+            cache = BitmapCache(settings.BITMAP_CACHE_SIZE)
+        return cache
+        
+def get(path, width=-1, height=-1, color=None):
+    return get_cache().get(path, width, height, color)
+    
+def invalidate(path):
+    get_cache().invalidate(path)
+    
\ No newline at end of file
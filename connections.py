@@ -0,0 +1,163 @@
+import time
+import socket
+import httplib
+import urllib
+import urllib2
+import logging
+import threading
+import util
+from StringIO import StringIO
+from settings import settings
+
+class ConnectionPool(object):
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.idle = {}
+        self.active = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    def acquire(self, key, factory, limit=None, deadline=None):
+        # limit is the number of connections allowed for the key, None
+        # for no limit, and a full key is waited on until the deadline
+        with self.condition:
+            self._evict()
+            while True:
+                idle = self.idle.get(key)
+                if idle:
+                    conn, released = idle.pop()
+                    self.hits += 1
+                    self.active[key] = self.active.get(key, 0) + 1
+                    return conn, True
+                if limit is None or self.active.get(key, 0) < limit:
+                    break
+                if deadline:
+                    util.check_deadline(deadline)
+                    self.condition.wait(deadline - time.time())
+                else:
+                    self.condition.wait()
+            self.misses += 1
+            self.active[key] = self.active.get(key, 0) + 1
+        try:
+            return factory(), False
+        except Exception:
+            self.release(key, None, False)
+            raise
+    def release(self, key, conn, reuse=True):
+        with self.condition:
+            self.active[key] -= 1
+            if not self.active[key]:
+                del self.active[key]
+            if conn and reuse:
+                self.idle.setdefault(key, []).append((conn, time.time()))
+            elif conn:
+                conn.close()
+            self.condition.notify_all()
+    def evict(self):
+        with self.condition:
+            self._evict()
+    def _evict(self):
+        cutoff = time.time() - settings.POOL_IDLE_TIMEOUT
+        for key, idle in self.idle.items():
+            for conn, released in idle:
+                if released < cutoff:
+                    conn.close()
+                    self.evictions += 1
+            idle = [(conn, released) for conn, released in idle if released >= cutoff]
+            if idle:
+                self.idle[key] = idle
+            else:
+                del self.idle[key]
+    def close(self):
+        with self.condition:
+            for idle in self.idle.values():
+                for conn, released in idle:
+                    conn.close()
+            self.idle.clear()
+    def stats(self):
+        with self.condition:
+            idle = sum(len(idle) for idle in self.idle.values())
+            active = sum(self.active.values())
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'idle': idle,
+                'active': active,
+            }
+    def log_stats(self):
+        stats = self.stats()
+        logging.info('Connection pool: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, %(idle)d idle, %(active)d active' % stats)
+        
+pool = ConnectionPool()
+
+class PooledHandler(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+    def http_open(self, req):
+        return self.do_pooled_open(httplib.HTTPConnection, req)
+    def https_open(self, req):
+        return self.do_pooled_open(httplib.HTTPSConnection, req)
+    def connect(self, connection_class, req, headers):
+        timeout = getattr(req, 'connect_timeout', None) or req.timeout
+        conn = connection_class(req.get_host(), timeout=timeout)
+        if req._tunnel_host:
+            tunnel_headers = {}
+            proxy_auth_hdr = 'Proxy-Authorization'
+            if proxy_auth_hdr in headers:
+                tunnel_headers[proxy_auth_hdr] = headers.pop(proxy_auth_hdr)
+            conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+        return conn
+    def send(self, conn, req, headers):
+        if conn.sock is None:
+            conn.connect()
+        timeout = getattr(req, 'read_timeout', None) or req.timeout
+        deadline = getattr(req, 'deadline', None)
+        if deadline:
+            util.check_deadline(deadline)
+            timeout = min(timeout, deadline - time.time())
+        conn.sock.settimeout(timeout)
+        conn.request(req.get_method(), req.get_selector(), req.data, headers)
+        return conn.getresponse(buffering=True)
+    def do_pooled_open(self, connection_class, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), value) for name, value in headers.items())
+        key = (req.get_type(), host, req._tunnel_host)
+        # every plain http feed goes through the same proxy connection key,
+        # the worker threads already bound how many of those are open
+        proxied = not req._tunnel_host and req.has_proxy()
+        limit = None if proxied else settings.POOL_MAX_PER_HOST
+        factory = lambda: self.connect(connection_class, req, headers)
+        conn, reused = self.pool.acquire(key, factory, limit, getattr(req, 'deadline', None))
+        try:
+            try:
+                response = self.send(conn, req, headers)
+            except (socket.error, httplib.HTTPException):
+                if not reused:
+                    raise
+                # the server closed the idle connection, retry on a new one
+                conn.close()
+                conn = factory()
+                response = self.send(conn, req, headers)
+            data = util.read_limited(response, getattr(req, 'max_size', None), getattr(req, 'deadline', None), priority=getattr(req, 'priority', None))
+        except (socket.error, httplib.HTTPException), e:
+            self.pool.release(key, conn, False)
+            raise urllib2.URLError(e)
+        except Exception:
+            self.pool.release(key, conn, False)
+            raise
+        self.pool.release(key, conn, not response.will_close)
+        result = urllib.addinfourl(StringIO(data), response.msg, req.get_full_url())
+        result.code = response.status
+        result.msg = response.reason
+        return result
+        
+def get_handler():
+    return PooledHandler(pool)
+    
\ No newline at end of file
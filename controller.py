@@ -4,23 +4,55 @@ import feeds
 import popups
 import view
 import updater
+import parsepool
+import resolver
+import websub
 import util
 import winsound
 import socket
+import time
+import logging
+import threading
 from settings import settings
 
 class Controller(object):
     def __init__(self):
         socket.setdefaulttimeout(settings.SOCKET_TIMEOUT)
+        if settings.DNS_CACHE:
+            resolver.install()
         self.icon = view.TaskBarIcon(self)
         self.manager = feeds.FeedManager()
         self.manager.load()
         self.add_default_feeds()
         self.popup = None
         self.polling = False
+        self.pushed = False
         self.enabled = True
+        self.timer = None
+        self.batch = []
+        self.batch_lock = threading.Lock()
+        self.batch_timer = None
+        if settings.WEBSUB_ENABLED:
+            self.start_websub()
         self.on_poll()
         self.on_check_for_updates()
+    def start_websub(self):
+        subscriber = websub.Subscriber(self.manager, self.on_push)
+        try:
+            subscriber.start()
+        except Exception:
+            logging.exception('Unable to start the WebSub callback server')
+            return
+        self.manager.subscriber = subscriber
+    def on_push(self, new_items):
+        self.add_to_batch(new_items)
+        wx.CallAfter(self.save_pushed)
+    def save_pushed(self):
+        # poll workers may be changing feeds, _poll_complete saves instead
+        if self.polling:
+            self.pushed = True
+        else:
+            self.save()
     def add_default_feeds(self):
         if self.manager.feeds:
             return
@@ -52,11 +84,31 @@ class Controller(object):
     def check_for_updates(self, force=True):
         updater.run(self, force)
     def on_poll(self):
+        self.timer = None
+        self.poll()
+    def schedule_poll(self):
+        if self.timer and self.timer.IsRunning():
+            self.timer.Stop()
+        due = self.manager.next_poll()
+        if due is None:
+            delay = settings.MAX_POLL_DELAY
+        else:
+            delay = due - time.time()
+        overdue = delay <= 0
+        if overdue:
+            # feeds are due but polling was skipped, check again soon
+            delay = settings.POLL_RETRY_INTERVAL
+        delay = min(delay, settings.MAX_POLL_DELAY)
+        self.timer = wx.CallLater(int(delay * 1000), self.on_poll)
+        if settings.DNS_CACHE and not self.polling and not overdue:
+            # overdue feeds were prefetched before they came due
+            self.manager.prefetch(delay + settings.DNS_PREFETCH_WINDOW)
+    def poll(self):
         try:
-            self.poll()
+            self.start_poll()
         finally:
-            wx.CallLater(1000 * 5, self.on_poll)
-    def poll(self):
+            self.schedule_poll()
+    def start_poll(self):
         if self.polling:
             return
         if not self.enabled:
@@ -73,9 +125,28 @@ class Controller(object):
         try:
             for new_items in self.manager.poll():
                 found_new = True
-                wx.CallAfter(self._poll_result, new_items)
+                self.add_to_batch(new_items)
         finally:
             wx.CallAfter(self._poll_complete, found_new)
+    def add_to_batch(self, new_items):
+        # results arriving close together are shown in one update
+        with self.batch_lock:
+            first = not self.batch
+            self.batch.extend(new_items)
+        if first:
+            wx.CallAfter(self.schedule_batch)
+    def schedule_batch(self):
+        if self.batch_timer and self.batch_timer.IsRunning():
+            return
+        self.batch_timer = wx.CallLater(int(settings.RESULT_BATCH_DELAY * 1000), self.flush_batch)
+    def flush_batch(self):
+        if self.batch_timer and self.batch_timer.IsRunning():
+            self.batch_timer.Stop()
+        with self.batch_lock:
+            new_items = self.batch
+            self.batch = []
+        if new_items:
+            self._poll_result(new_items)
     def _poll_result(self, new_items):
         items = self.manager.items
         if self.popup:
@@ -85,13 +156,17 @@ class Controller(object):
         items.extend(new_items)
         self.show_items(items, index, False)
     def _poll_complete(self, found_new):
-        if found_new:
+        self.flush_batch()
+        if found_new or self.pushed:
+            self.pushed = False
             self.save()
         self.polling = False
         self.icon.set_icon('icons/feed.png')
+        self.schedule_poll()
     def force_poll(self):
         for feed in self.manager.feeds:
             feed.last_poll = 0
+        self.manager.reschedule()
         self.poll()
     def show_items(self, items, index, focus):
         play_sound = False
@@ -136,6 +211,8 @@ class Controller(object):
             if self.popup:
                 self.popup.on_close()
             wx.CallAfter(self.icon.Destroy)
+            self.manager.close()
+            parsepool.close()
         finally:
             pass #wx.GetApp().ExitMainLoop()
     def on_popup_close(self, event):
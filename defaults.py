@@ -32,10 +32,55 @@ USER_IDLE_TIMEOUT = 60
 DISABLE_WHEN_IDLE = True
 ITEM_CACHE_AGE = 60 * 60 * 24 * 1
 FEED_CACHE_SIZE = 1000
+STREAMING_PARSER = True
+MAX_RESPONSE_SIZE = 1024 * 1024 * 5
+MAX_FAVICON_SIZE = 1024 * 256
+BITMAP_CACHE_SIZE = 200
+PARSE_PROCESSES = 0 # 0 parses in the polling threads
 MAX_WORKER_THREADS = 10
+WORKER_QUEUE_SIZE = 100
+WORKER_SHUTDOWN_TIMEOUT = 5
+AUTOTUNE_WORKERS = False
+AUTOTUNE_MIN_WORKERS = 2
+AUTOTUNE_MAX_WORKERS = 40
+AUTOTUNE_WINDOW = 10 # jobs between adjustments
+AUTOTUNE_MAX_ERROR_RATE = 0.25
+AUTOTUNE_LATENCY_FACTOR = 3.0
+POLL_ENGINE = 'threads' # 'threads' or 'async'
+POLL_ORDER = 'list' # 'list' or 'priority'
+ASYNC_MAX_CONNECTIONS = 200
+POLL_RETRY_INTERVAL = 5
+HOST_MAX_CONNECTIONS = 2
+HOST_POLL_DELAY = 1
+ADAPTIVE_POLLING = False
+ADAPTIVE_MIN_INTERVAL = 60 * 2
+ADAPTIVE_MAX_INTERVAL = 60 * 60 * 6
+ADAPTIVE_SMOOTHING = 0.3
+HONOR_FRESHNESS_HINTS = True
+MAX_FRESHNESS_HINT = 60 * 60 * 24
+SPREAD_POLLS = True
+POLL_JITTER = 30
+POLL_JITTER_FRACTION = 0.05
+FIRST_POLL_SPREAD = 30
+FOLLOW_PERMANENT_REDIRECTS = True
+REWRITE_REDIRECTED_URLS = False
+BACKOFF_MIN = 60
+BACKOFF_MAX = 60 * 60 * 6
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60 * 60 * 12
+MAX_POLL_DELAY = 60 * 5
+RESULT_BATCH_DELAY = 0.5
 PLAY_SOUND = True
 SOUND_PATH = 'sounds/notification.wav'
 SOCKET_TIMEOUT = 15
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 15
+REQUEST_TIMEOUT = 60
+ADAPTIVE_TIMEOUTS = True
+TIMEOUT_LATENCY_FACTOR = 5
+MIN_ADAPTIVE_TIMEOUT = 5
+LATENCY_SMOOTHING = 0.3
+POLL_CYCLE_DEADLINE = 60 * 3
 
 # Initial Setup
 DEFAULT_FEED_URLS = [
@@ -46,6 +91,42 @@ DEFAULT_FEED_URLS = [
 USE_PROXY = False
 PROXY_URL = ''
 
+# Connection Pool Settings
+USE_CONNECTION_POOL = True
+POOL_MAX_PER_HOST = 4
+POOL_IDLE_TIMEOUT = 60
+
+# Bandwidth Settings
+MAX_REQUESTS_PER_MINUTE = 0 # 0 for no limit
+MAX_BYTES_PER_SECOND = 0 # 0 for no limit
+RATE_LIMIT_BURST = 10 # seconds of budget that may be used at once
+
+# DNS Cache Settings
+DNS_CACHE = True
+DNS_CACHE_TTL = 60 * 5
+DNS_NEGATIVE_TTL = 30
+DNS_CACHE_SIZE = 1000
+DNS_PREFETCH = True
+DNS_PREFETCH_WINDOW = 60
+DNS_PREFETCH_LIMIT = 50
+
+# WebSub Settings
+WEBSUB_ENABLED = False
+WEBSUB_HOST = ''
+WEBSUB_PORT = 8337
+WEBSUB_CALLBACK_URL = '' # public url of the callback server, if different
+WEBSUB_LEASE = 60 * 60 * 24 * 7
+WEBSUB_RENEW_MARGIN = 60 * 60 * 24
+WEBSUB_RETRY_INTERVAL = 60 * 60
+WEBSUB_FALLBACK_INTERVAL = 60 * 60 * 6
+
+# Favicon Settings
+FAVICON_TTL = 60 * 60 * 24 * 7
+FAVICON_NEGATIVE_TTL = 60 * 60 * 24
+FAVICON_THREADS = 2
+FAVICON_QUEUE_SIZE = 50
+FAVICON_DISCOVERY = True # look for <link rel="icon"> when /favicon.ico is missing
+
 # Updater Settings
 LOCAL_REVISION = load_revision()
 REVISION_URL = 'http://www.feednotifier.com/update/revision.txt'
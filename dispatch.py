@@ -0,0 +1,99 @@
+import time
+import heapq
+import itertools
+import urlparse
+import threading
+import collections
+from settings import settings
+
+def get_host(url):
+    try:
+        return urlparse.urlsplit(url).hostname or ''
+    except Exception:
+        return ''
+        
+class HostQueue(object):
+    def __init__(self, max_per_host=None, delay=None, maxsize=0):
+        self.max_per_host = max_per_host or settings.HOST_MAX_CONNECTIONS
+        self.delay = settings.HOST_POLL_DELAY if delay is None else delay
+        self.maxsize = maxsize
+        self.closed = False
+        self.condition = threading.Condition()
+        self.queues = {}
+        self.order = collections.deque()
+        self.active = {}
+        self.last_start = {}
+        self.counter = itertools.count()
+        self.count = 0
+    def __len__(self):
+        return self.count
+    def put(self, url, job, priority=0):
+        host = get_host(url)
+        with self.condition:
+            while self.maxsize and self.count >= self.maxsize and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            if host not in self.queues:
+                self.queues[host] = []
+                self.order.append(host)
+            heapq.heappush(self.queues[host], (-priority, next(self.counter), job))
+            self.count += 1
+            self.condition.notify_all()
+            return True
+    def _next(self, now):
+        # the ready host with the highest priority job goes next, hosts
+        # take turns when priorities are equal
+        wait = None
+        best = None
+        for index, host in enumerate(self.order):
+            if self.active.get(host, 0) >= self.max_per_host:
+                continue
+            ready = self.last_start.get(host, 0) + self.delay
+            if ready > now:
+                wait = ready - now if wait is None else min(wait, ready - now)
+                continue
+            priority = self.queues[host][0][0]
+            if best is None or priority < best[0]:
+                best = (priority, index, host)
+        if best is None:
+            return None, None, wait
+        priority, index, host = best
+        self.order.rotate(-(index + 1))
+        queue = self.queues[host]
+        job = heapq.heappop(queue)[2]
+        if not queue:
+            del self.queues[host]
+            self.order.remove(host)
+        self.count -= 1
+        self.active[host] = self.active.get(host, 0) + 1
+        self.last_start[host] = now
+        self.condition.notify_all()
+        return host, job, None
+    def get(self, block=True, persistent=False):
+        # persistent consumers keep waiting for new jobs until closed
+        with self.condition:
+            while not self.closed and (self.count or persistent):
+                wait = None
+                if self.count:
+                    host, job, wait = self._next(time.time())
+                    if job is not None:
+                        return host, job
+                if not block:
+                    break
+                self.condition.wait(wait)
+            return None, None
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.queues.clear()
+            self.order.clear()
+            self.count = 0
+            self.condition.notify_all()
+    def done(self, host):
+        with self.condition:
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            self.condition.notify_all()
+            
\ No newline at end of file
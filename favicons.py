@@ -0,0 +1,220 @@
+import wx
+import os
+import re
+import time
+import Queue
+import urllib2
+import urlparse
+import logging
+import threading
+import util
+import bitmaps
+import safe_pickle
+from settings import settings
+
+SIGNATURES = [
+    '\x00\x00\x01\x00', # ico
+    '\x89PNG\r\n\x1a\n',
+    'GIF87a',
+    'GIF89a',
+    '\xff\xd8\xff', # jpeg
+    'BM',
+]
+
+LINK_PATTERN = re.compile(r'<link\b[^>]*>', re.I)
+ATTRIBUTE_PATTERN = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+def is_image(data):
+    return any(data.startswith(signature) for signature in SIGNATURES)
+    
+def find_links(data, base_url):
+    # <link rel="icon" href="..."> and <link rel="shortcut icon" ...>
+    result = []
+    for tag in LINK_PATTERN.findall(data):
+        attributes = {}
+        for name, value1, value2, value3 in ATTRIBUTE_PATTERN.findall(tag):
+            attributes[name.lower()] = value1 or value2 or value3
+        rel = attributes.get('rel', '').lower().split()
+        href = attributes.get('href', '').strip()
+        if 'icon' in rel and href:
+            result.append(urlparse.urljoin(base_url, href.replace('&amp;', '&')))
+    return result
+    
+def get_domain(url):
+    return urlparse.urlsplit(url or '')[1]
+    
+def get_path(url):
+    path = 'icons/cache/%s.ico' % get_domain(url)
+    return os.path.abspath(path)
+    
+class FaviconService(object):
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.pending = set()
+        self.jobs = Queue.Queue(settings.FAVICON_QUEUE_SIZE)
+        self.threads = []
+        self.load()
+    def load(self):
+        # domain -> (expiry, icon url, etag, modified)
+        try:
+            self.entries = safe_pickle.load(self.path)
+        except Exception:
+            self.entries = {}
+    def save(self):
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            os.makedirs(os.path.dirname(self.path))
+        except Exception:
+            pass
+        try:
+            safe_pickle.save(self.path, entries)
+        except Exception:
+            logging.exception('Failed to save favicon index')
+    def is_fresh(self, domain, now):
+        # the caller must hold the lock
+        entry = self.entries.get(domain)
+        if entry is None:
+            # icons downloaded before the index existed
+            path = get_path('//' + domain)
+            if not os.path.exists(path):
+                return False
+            expiry = os.path.getmtime(path) + settings.FAVICON_TTL
+            entry = self.entries[domain] = (expiry, None, None, None)
+        return entry[0] > now
+    def request(self, link):
+        # queues a favicon fetch, at most one per domain at a time
+        domain = get_domain(link)
+        if not domain:
+            return False
+        with self.lock:
+            if domain in self.pending or self.is_fresh(domain, time.time()):
+                return False
+            self.pending.add(domain)
+        try:
+            self.jobs.put_nowait((domain, link))
+        except Queue.Full:
+            with self.lock:
+                self.pending.discard(domain)
+            return False
+        self.start()
+        return True
+    def start(self):
+        with self.lock:
+            while len(self.threads) < settings.FAVICON_THREADS:
+                self.threads.append(util.start_thread(self.worker))
+    def worker(self):
+        while True:
+            domain, link = self.jobs.get()
+            try:
+                self.update(domain, link)
+            except Exception:
+                logging.exception('Favicon update for "%s" failed' % domain)
+            finally:
+                with self.lock:
+                    self.pending.discard(domain)
+            self.save()
+    def fetch(self, url, etag=None, modified=None, limit=None):
+        request = urllib2.Request(url)
+        request.add_header('User-Agent', settings.USER_AGENT)
+        if etag:
+            request.add_header('If-None-Match', etag)
+        if modified:
+            request.add_header('If-Modified-Since', modified)
+        opener = urllib2.build_opener(util.get_proxy())
+        try:
+            f = opener.open(request, timeout=settings.READ_TIMEOUT)
+        except urllib2.HTTPError, e:
+            if e.code == 304:
+                return 304, None, None, None
+            raise
+        try:
+            if limit:
+                # only the start of a page is needed to find its icon links
+                data = ''
+                for chunk in util.iter_chunks(f, priority=0):
+                    data += chunk
+                    if len(data) >= limit:
+                        break
+            else:
+                data = util.read_limited(f, settings.MAX_FAVICON_SIZE, priority=0)
+            headers = f.info()
+            return f.code or 200, data, headers.get('etag'), headers.get('last-modified')
+        finally:
+            f.close()
+    def update(self, domain, link):
+        with self.lock:
+            expiry, known_url, etag, modified = self.entries.get(domain, (0, None, None, None))
+        path = get_path(link)
+        scheme = urlparse.urlsplit(link)[0] or 'http'
+        default_url = '%s://%s/favicon.ico' % (scheme, domain)
+        candidates = [known_url or default_url]
+        if not os.path.exists(path):
+            etag = modified = None
+        discovered = False
+        while candidates:
+            url = candidates.pop(0)
+            try:
+                status, data, new_etag, new_modified = self.fetch(url, etag if url == known_url else None, modified if url == known_url else None)
+            except Exception, e:
+                status, data = None, None
+                logging.info('Favicon fetch from "%s" failed: %s' % (url, e))
+            if status == 304:
+                self.set_entry(domain, settings.FAVICON_TTL, url, etag, modified)
+                return True
+            if data and is_image(data):
+                self.write(path, data)
+                self.set_entry(domain, settings.FAVICON_TTL, url, new_etag, new_modified)
+                logging.info('Downloaded favicon for "%s" from "%s"' % (domain, url))
+                return True
+            if not candidates and not discovered and settings.FAVICON_DISCOVERY:
+                discovered = True
+                candidates = [x for x in self.discover(link) if x != url]
+                if default_url != url and default_url not in candidates:
+                    candidates.append(default_url)
+        # keep a stale icon around, but do not ask again for a while
+        logging.info('No favicon found for "%s"' % domain)
+        self.set_entry(domain, settings.FAVICON_NEGATIVE_TTL, None, None, None)
+        return False
+    def discover(self, link):
+        try:
+            status, data, etag, modified = self.fetch(link, limit=settings.MAX_FAVICON_SIZE)
+        except Exception, e:
+            logging.info('Favicon discovery on "%s" failed: %s' % (link, e))
+            return []
+        return find_links(data or '', link)
+    def write(self, path, data):
+        # write to a temporary file first so readers never see a partial icon
+        try:
+            os.makedirs(os.path.dirname(path))
+        except Exception:
+            pass
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        os.rename(tmp_path, path)
+        # drop decoded copies of the old icon on the gui thread
+        wx.CallAfter(bitmaps.invalidate, path)
+    def set_entry(self, domain, ttl, url, etag, modified):
+        with self.lock:
+            self.entries[domain] = (time.time() + ttl, url, etag, modified)
+            
+lock = threading.Lock()
+service = None
+
+def get_service():
+    global service
+    with lock:
+        if service is None:
+            service = FaviconService(os.path.abspath('icons/cache/index.dat'))
+        return service
+        
+def request(link):
+    return get_service().request(link)
+    
\ No newline at end of file
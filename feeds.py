@@ -1,16 +1,35 @@
 import os
+import math
 import time
+import socket
 import calendar
+import threading
 import uuid
-import urlparse
-import urllib2
 import filters
 import util
+import asyncpoll
+import connections
+import scheduler
+import parsepool
+import workers
+import resolver
+import ratelimit
+import favicons
 import Queue
 import logging
 import safe_pickle
 from settings import settings
 
+BREAKER_CLOSED = 0
+BREAKER_OPEN = 1
+BREAKER_HALF_OPEN = 2
+
+BREAKER_STR = {
+    BREAKER_CLOSED: 'closed',
+    BREAKER_OPEN: 'open',
+    BREAKER_HALF_OPEN: 'half-open',
+}
+
 def cmp_timestamp(a, b):
     return cmp(a.timestamp, b.timestamp)
     
@@ -19,6 +38,29 @@ def create_id(entry):
     values = tuple(util.get(entry, key, None) for key in keys)
     return values if any(values) else uuid.uuid4().hex
     
+def is_timeout(error):
+    reason = getattr(error, 'reason', None)
+    return isinstance(error, socket.timeout) or isinstance(reason, socket.timeout)
+    
+update_locks = {}
+update_locks_lock = threading.Lock()
+
+def get_update_lock(feed):
+    # feeds are pickled, so their locks live here; a poll and a WebSub
+    # push of the same feed must not update its seen ids at the same time
+    with update_locks_lock:
+        if feed.uuid not in update_locks:
+            update_locks[feed.uuid] = threading.RLock()
+        return update_locks[feed.uuid]
+        
+def get_fields(entry):
+    timestamp = calendar.timegm(util.get(entry, 'date_parsed', time.gmtime()))
+    title = util.format(util.get(entry, 'title', ''), settings.POPUP_TITLE_LENGTH)
+    description = util.format(util.get(entry, 'description', ''), settings.POPUP_BODY_LENGTH)
+    link = util.get(entry, 'link', '')
+    author = util.format(util.get(entry, 'author', '')) # TODO: max length
+    return timestamp, title, description, link, author
+    
 class Item(object):
     def __init__(self, feed, id):
         self.feed = feed
@@ -45,6 +87,7 @@ class Feed(object):
         self.interval = settings.DEFAULT_POLLING_INTERVAL
         self.etag = None
         self.modified = None
+        self.digest = None
         self.title = ''
         self.link = ''
         self.clicks = 0
@@ -52,94 +95,316 @@ class Feed(object):
         self.color = None
         self.id_list = []
         self.id_set = set()
+        self.item_rate = None
+        self.rate_timestamp = 0
+        self.ttl = 0
+        self.skip_hours = set()
+        self.skip_days = set()
+        self.fresh_until = 0
+        self.error_count = 0
+        self.failures = 0
+        self.breaker = BREAKER_CLOSED
+        self.retry_after = 0
+        self.last_error = ''
+        self.moved_url = None
+        self.temporary_url = None
+        self.temporary_url_expiry = 0
+        self.max_size = None
+        self.abort_count = 0
+        self.bytes_transferred = 0
+        self.bytes_decoded = 0
+        self.latency = None
+        self.hub = None
+        self.topic = None
+        self.websub_secret = None
+        self.websub_expiry = 0
     def make_copy(self):
         feed = Feed(self.url)
-        for key in ['uuid', 'enabled', 'interval', 'title', 'link', 'clicks', 'item_count', 'color']:
+        for key in ['uuid', 'enabled', 'interval', 'title', 'link', 'clicks', 'item_count', 'color', 'item_rate', 'error_count', 'breaker', 'abort_count', 'max_size']:
             value = getattr(self, key)
             setattr(feed, key, value)
         return feed
     def copy_from(self, feed):
-        for key in ['enabled', 'interval', 'title', 'link', 'color']:
+        for key in ['enabled', 'interval', 'title', 'link', 'color', 'max_size']:
             value = getattr(feed, key)
             setattr(self, key, value)
     @property
-    def favicon_url(self):
-        components = urlparse.urlsplit(self.link)
-        scheme, domain = components[:2]
-        return '%s://%s/favicon.ico' % (scheme, domain)
-    @property
     def favicon_path(self):
-        components = urlparse.urlsplit(self.link)
-        scheme, domain = components[:2]
-        path = 'icons/cache/%s.ico' % domain
-        return os.path.abspath(path)
+        return favicons.get_path(self.link)
     @property
     def has_favicon(self):
         return os.path.exists(self.favicon_path)
     def download_favicon(self):
-        # make cache directory if needed
-        try:
-            dir, name = os.path.split(self.favicon_path)
-            os.makedirs(dir)
-        except Exception:
-            pass
-        # try to download the favicon
-        try:
-            opener = urllib2.build_opener(util.get_proxy())
-            f = opener.open(self.favicon_url)
-            data = f.read()
-            f.close()
-            f = open(self.favicon_path, 'wb')
-            f.write(data)
-            f.close()
-        except Exception:
-            pass
+        # queued on the favicon service, which fetches each domain once
+        return favicons.request(self.link)
     def clear_cache(self):
         self.id_list = []
         self.id_set = set()
         self.etag = None
         self.modified = None
+        self.digest = None
     def clean_cache(self, size):
         for id in self.id_list[:-size]:
             self.id_set.remove(id)
         self.id_list = self.id_list[-size:]
+    @property
+    def effective_interval(self):
+        if self.pushed:
+            # the hub pushes updates, polling is only a fallback
+            return max(self.interval, settings.WEBSUB_FALLBACK_INTERVAL)
+        if settings.ADAPTIVE_POLLING and self.item_rate is not None:
+            return util.adaptive_polling_interval(self.item_rate)
+        return self.interval
+    @property
+    def pushed(self):
+        return settings.WEBSUB_ENABLED and self.websub_expiry > time.time()
+    @property
+    def priority(self):
+        # engagement: clicks per item, weighted up for feeds that have been
+        # producing items lately
+        result = float(self.clicks) / max(self.item_count, 1)
+        if self.item_rate:
+            result *= 1 + math.log1p(self.item_rate * 60 * 60 * 24)
+        return result
+    @property
+    def fetch_key(self):
+        return (self.url, self.username, self.password)
+    @property
+    def phase(self):
+        # copies of the same feed share a phase so they come due together
+        return util.get_fraction(*self.fetch_key)
+    @property
+    def next_poll(self):
+        if not self.last_poll:
+            return 0
+        interval = self.effective_interval
+        result = self.last_poll + interval
+        if settings.SPREAD_POLLS:
+            result = util.align_to_phase(result, interval, self.phase)
+            result += util.get_jitter(interval, self.url, self.last_poll)
+            result = int(max(result, self.last_poll + interval / 2))
+        if settings.HONOR_FRESHNESS_HINTS:
+            fresh_until = min(self.fresh_until, self.last_poll + settings.MAX_FRESHNESS_HINT)
+            result = max(result, fresh_until)
+            result = util.skip_times(result, self.skip_hours, self.skip_days)
+        if self.failures:
+            result = max(result, self.retry_after)
+        return result
+    def update_rate(self, count, timestamp):
+        if self.rate_timestamp:
+            elapsed = timestamp - self.rate_timestamp
+            if elapsed > 0:
+                rate = float(count) / elapsed
+                if self.item_rate is None:
+                    self.item_rate = rate
+                else:
+                    alpha = settings.ADAPTIVE_SMOOTHING
+                    self.item_rate = alpha * rate + (1 - alpha) * self.item_rate
+        self.rate_timestamp = timestamp
     def should_poll(self):
         if not self.enabled:
             return False
         now = int(time.time())
-        duration = now - self.last_poll
-        return duration >= self.interval
-    def poll(self, timestamp, filters):
+        return now >= self.next_poll
+    def start_poll(self, timestamp):
         logging.info('Polling feed "%s"' % self.url)
-        result = []
         self.last_poll = timestamp
+        if self.breaker == BREAKER_OPEN:
+            self.breaker = BREAKER_HALF_OPEN
         username = util.decode_password(self.username)
         password = util.decode_password(self.password)
-        d = util.parse(self.url, username, password, self.etag, self.modified)
-        self.etag = util.get(d, 'etag', None)
-        self.modified = util.get(d, 'modified', None)
-        feed = util.get(d, 'feed', None)
-        if feed:
-            self.title = self.title or util.get(feed, 'title', '')
-            self.link = self.link or util.get(feed, 'link', self.url)
-        entries = util.get(d, 'entries', [])
-        for entry in reversed(entries):
-            id = create_id(entry)
-            if id in self.id_set:
-                continue
-            self.item_count += 1
-            self.id_list.append(id)
-            self.id_set.add(id)
-            item = Item(self, id)
-            item.timestamp = calendar.timegm(util.get(entry, 'date_parsed', time.gmtime()))
-            item.title = util.format(util.get(entry, 'title', ''), settings.POPUP_TITLE_LENGTH)
-            item.description = util.format(util.get(entry, 'description', ''), settings.POPUP_BODY_LENGTH)
-            item.link = util.get(entry, 'link', '')
-            item.author = util.format(util.get(entry, 'author', '')) # TODO: max length
-            if all(filter.filter(item) for filter in filters):
-                result.append(item)
+        return (self.get_fetch_url(timestamp), username, password, self.etag, self.modified)
+    def get_max_size(self):
+        return self.max_size or settings.MAX_RESPONSE_SIZE
+    def get_fetch_url(self, timestamp):
+        if self.temporary_url and self.temporary_url_expiry > timestamp:
+            return self.temporary_url
+        return self.moved_url or self.url
+    def update_redirects(self, redirects):
+        # leading permanent redirects are remembered for good, a temporary
+        # redirect after them only for as long as it may be cached
+        permanent = None
+        temporary = None
+        expiry = 0
+        for status, url, url_expiry in redirects:
+            if status in (301, 308) and temporary is None:
+                permanent = url
+            else:
+                temporary = url
+                expiry = url_expiry if not expiry else min(expiry, url_expiry)
+        if permanent and settings.FOLLOW_PERMANENT_REDIRECTS and permanent != self.get_fetch_url(self.last_poll):
+            if settings.REWRITE_REDIRECTED_URLS:
+                logging.info('Rewriting feed URL "%s" to "%s" after a permanent redirect' % (self.url, permanent))
+                self.url = permanent
+                self.moved_url = None
+            else:
+                logging.info('Feed "%s" has permanently moved to "%s"' % (self.url, permanent))
+                self.moved_url = permanent
+        if temporary and expiry > self.last_poll:
+            self.temporary_url = temporary
+            self.temporary_url_expiry = expiry
+        elif redirects:
+            self.temporary_url = None
+            self.temporary_url_expiry = 0
+    def poll(self, timestamp, filters, deadline=None):
+        url, username, password, etag, modified = self.start_poll(timestamp)
+        timeouts = self.get_timeouts(deadline)
+        start = time.time()
+        if parsepool.is_enabled() and util.is_http(url):
+            status, url, headers, data, redirects, transferred = util.fetch(url, username, password, etag, modified, self.get_max_size(), timeouts, self.priority)
+            self.update_latency(time.time() - start)
+            return parsepool.parse(self, url, status, headers, data, redirects, transferred, filters)
+        d = util.parse(url, username, password, etag, modified, self.digest, self.get_known(), self.get_max_size(), timeouts, self.priority)
+        self.update_latency(time.time() - start)
+        return self.update(d, filters)
+    def get_limits(self):
+        # fast feeds get tighter deadlines learned from their past latency
+        connect, read, total = util.get_default_limits()
+        if settings.ADAPTIVE_TIMEOUTS and self.latency is not None:
+            learned = max(settings.MIN_ADAPTIVE_TIMEOUT, self.latency * settings.TIMEOUT_LATENCY_FACTOR)
+            read = min(read, learned)
+            total = min(total, learned)
+        return connect, read, total
+    def get_timeouts(self, deadline=None):
+        connect, read, total = self.get_limits()
+        result = time.time() + total
+        if deadline:
+            result = min(result, deadline)
+        return connect, read, result
+    def update_latency(self, elapsed):
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            alpha = settings.LATENCY_SMOOTHING
+            self.latency = alpha * elapsed + (1 - alpha) * self.latency
+    def get_known(self):
+        if not self.id_set:
+            return None
+        return self.is_known
+    def is_known(self, entry):
+        return create_id(entry) in self.id_set
+    def succeed(self):
+        if self.breaker != BREAKER_CLOSED:
+            logging.info('Feed "%s" recovered after %d failures' % (self.url, self.failures))
+        self.failures = 0
+        self.breaker = BREAKER_CLOSED
+        self.retry_after = 0
+    def fail(self, error):
+        self.error_count += 1
+        self.failures += 1
+        self.last_error = str(error)
+        if is_timeout(error) and self.latency is not None:
+            # the learned timeouts may be too tight, start over from the defaults
+            self.latency = None
+        if isinstance(error, util.ResponseTooLarge):
+            self.abort_count += 1
+            logging.info('Aborted oversized response for feed "%s" (%d aborts)' % (self.url, self.abort_count))
+        if self.moved_url or self.temporary_url:
+            # the learned location may be the problem, start over from the feed url
+            logging.info('Forgetting redirects for feed "%s"' % self.url)
+            self.moved_url = None
+            self.temporary_url = None
+            self.temporary_url_expiry = 0
+        if self.breaker == BREAKER_HALF_OPEN or self.failures >= settings.BREAKER_THRESHOLD:
+            self.breaker = BREAKER_OPEN
+            delay = settings.BREAKER_COOLDOWN
+        else:
+            # double the regular interval for every failure in a row
+            base = max(self.effective_interval, settings.BACKOFF_MIN)
+            delay = min(base * 2 ** self.failures, settings.BACKOFF_MAX)
+        self.retry_after = self.last_poll + delay
+        logging.info('Feed "%s" failed %d time(s) in a row, circuit %s, retrying in %s: %s' % (self.url, self.failures, BREAKER_STR[self.breaker], util.split_time_str(delay), self.last_error))
+    def record_transfer(self, transferred, size):
+        if not size:
+            return
+        self.bytes_transferred += transferred
+        self.bytes_decoded += size
+        logging.info('Feed "%s" transferred %d bytes, %d decoded' % (self.url, transferred, size))
+    def update_hints(self, status, headers, hints):
+        if hints:
+            self.ttl, self.skip_hours, self.skip_days = hints
+        expiry = util.get_header_expiry(status, headers, self.last_poll)
+        self.fresh_until = max(expiry, self.last_poll + self.ttl)
+    def begin_update(self, status, headers, redirects, etag, modified, digest, hints):
+        self.update_hints(status, headers, hints)
+        if status >= 400:
+            raise IOError('HTTP error %d' % status)
+        self.update_redirects(redirects)
+        self.etag = etag
+        self.modified = modified
+        self.digest = digest or self.digest
+    def update_links(self, hub, topic, url):
+        if hub and (hub, topic or url) != (self.hub, self.topic):
+            logging.info('Feed "%s" advertises WebSub hub "%s"' % (self.url, hub))
+            self.hub = hub
+            self.topic = topic or url
+            self.websub_expiry = 0
+    def update_info(self, title, link):
+        self.title = self.title or title
+        self.link = self.link or link or self.url
+    def create_item(self, id, timestamp, title, description, link, author):
+        self.item_count += 1
+        self.id_list.append(id)
+        self.id_set.add(id)
+        item = Item(self, id)
+        item.timestamp = timestamp
+        item.title = title
+        item.description = description
+        item.link = link
+        item.author = author
+        return item
+    def end_update(self, count):
+        self.update_rate(count, self.last_poll)
         self.clean_cache(settings.FEED_CACHE_SIZE)
-        return result
+        self.succeed()
+    def update(self, d, filters):
+        with get_update_lock(self):
+            data = util.get(d, 'data', None)
+            self.record_transfer(util.get(d, 'transferred', 0), len(data or ''))
+            hints = util.get_feed_hints(data) if data else None
+            status = util.get(d, 'status', 200)
+            headers = util.get(d, 'headers', {})
+            etag = util.get(d, 'etag', None)
+            modified = util.get(d, 'modified', None)
+            redirects = util.get(d, 'redirects', [])
+            self.begin_update(status, headers, redirects, etag, modified, util.get(d, 'digest', None), hints)
+            feed = util.get(d, 'feed', None)
+            if feed:
+                self.update_info(util.get(feed, 'title', ''), util.get(feed, 'link', ''))
+            self.update_links(*util.get_websub_links(feed, headers), url=util.get(d, 'href', self.url))
+            result = []
+            count = 0
+            entries = util.get(d, 'entries', [])
+            for entry in reversed(entries):
+                id = create_id(entry)
+                if id in self.id_set:
+                    continue
+                count += 1
+                item = self.create_item(id, *get_fields(entry))
+                if all(filter.filter(item) for filter in filters):
+                    result.append(item)
+            self.end_update(count)
+            return result
+    def update_records(self, result, filters):
+        with get_update_lock(self):
+            self.record_transfer(result['transferred'], result['size'])
+            self.begin_update(result['status'], result['headers'], result['redirects'], result['etag'], result['modified'], result['digest'], result['hints'])
+            if result['feed']:
+                self.update_info(result['title'], result['link'])
+            self.update_links(*result['links'], url=result['href'])
+            items = []
+            count = 0
+            for id, fields, results in result['records']:
+                if id in self.id_set:
+                    continue
+                count += 1
+                item = self.create_item(id, *fields)
+                for filter, success in zip(filters, results):
+                    filter.record(success)
+                if len(results) == len(filters) and all(results):
+                    items.append(item)
+            self.end_update(count)
+            return items
         
 class Filter(object):
     def __init__(self, code, ignore_case=True, whole_word=True, feeds=None):
@@ -161,30 +426,40 @@ class Filter(object):
         for key in ['enabled', 'code', 'ignore_case', 'whole_word', 'feeds']:
             value = getattr(filter, key)
             setattr(self, key, value)
-    def filter(self, item):
+    def applies_to(self, feed):
         if not self.enabled:
-            return True
-        if self.feeds and item.feed not in self.feeds:
-            return True
+            return False
+        return not self.feeds or feed in self.feeds
+    def record(self, success):
         self.inputs += 1
-        rule = filters.parse(self.code) # TODO: cache parsed rules
-        if rule.evaluate(item, self.ignore_case, self.whole_word):
+        if success:
             self.outputs += 1
+    def filter(self, item):
+        if not self.applies_to(item.feed):
             return True
-        else:
-            return False
+        rule = filters.parse(self.code) # TODO: cache parsed rules
+        success = rule.evaluate(item, self.ignore_case, self.whole_word)
+        self.record(success)
+        return success
             
 class FeedManager(object):
     def __init__(self):
         self.feeds = []
         self.items = []
         self.filters = []
+        self.scheduler = scheduler.Scheduler()
+        self.workers = None
+        self.subscriber = None
     def add_feed(self, feed):
         logging.info('Adding feed "%s"' % feed.url)
         self.feeds.append(feed)
+        self.scheduler.schedule(feed)
     def remove_feed(self, feed):
         logging.info('Removing feed "%s"' % feed.url)
         self.feeds.remove(feed)
+        self.scheduler.remove(feed)
+        if self.subscriber:
+            self.subscriber.unsubscribe(feed)
         for filter in self.filters:
             filter.feeds.discard(feed)
     def add_filter(self, filter):
@@ -193,41 +468,287 @@ class FeedManager(object):
     def remove_filter(self, filter):
         logging.info('Removing filter "%s"' % filter.code)
         self.filters.remove(filter)
+    def reschedule(self):
+        self.scheduler.reset(self.feeds)
+    def next_poll(self):
+        return self.scheduler.next_due()
     def should_poll(self):
-        return any(feed.should_poll() for feed in self.feeds)
+        due = self.scheduler.next_due()
+        return due is not None and due <= int(time.time())
+    def prefetch(self, window):
+        now = int(time.time())
+        feeds = self.scheduler.peek(now + window, settings.DNS_PREFETCH_LIMIT)
+        resolver.prefetch([feed.get_fetch_url(now) for feed in feeds])
+    def pop_due(self, now):
+        feeds = self.scheduler.pop_due(now)
+        if settings.POLL_ORDER == 'priority':
+            feeds.sort(key=lambda feed: feed.priority, reverse=True)
+        return feeds
     def poll(self):
         now = int(time.time())
-        jobs = Queue.Queue()
-        results = Queue.Queue()
-        feeds = [feed for feed in self.feeds if feed.should_poll()]
-        for feed in feeds:
-            jobs.put(feed)
-        count = len(feeds)
-        logging.info('Starting worker threads')
-        for i in range(min(count, settings.MAX_WORKER_THREADS)):
-            util.start_thread(self.worker, now, jobs, results)
-        while count:
-            items = results.get()
-            count -= 1
+        feeds = self.pop_due(now)
+        deadline = None
+        if settings.POLL_CYCLE_DEADLINE:
+            deadline = time.time() + settings.POLL_CYCLE_DEADLINE
+        if settings.POLL_ENGINE == 'async' and asyncpoll.is_supported():
+            results = self.poll_async(now, feeds, deadline)
+        else:
+            results = self.poll_threads(now, feeds, deadline)
+        for feed, items in results:
+            self.scheduler.schedule(feed)
             if items:
                 yield items
-        logging.info('Worker threads completed')
-    def worker(self, now, jobs, results):
-        while True:
+        if self.workers:
+            self.workers.log_stats()
+        resolver.log_stats()
+        if self.subscriber:
+            # hub requests can take a while, keep them out of the poll cycle
+            util.start_thread(self.subscriber.maintain, list(self.feeds))
+        if settings.USE_CONNECTION_POOL:
+            connections.pool.evict()
+            connections.pool.log_stats()
+    def get_workers(self):
+        if self.workers is None:
+            size = settings.MAX_WORKER_THREADS
+            if settings.AUTOTUNE_WORKERS:
+                size = max(settings.AUTOTUNE_MIN_WORKERS, min(settings.AUTOTUNE_MAX_WORKERS, size))
+            self.workers = workers.WorkerPool(size)
+            self.workers.start()
+        return self.workers
+    def close(self):
+        if self.subscriber:
+            self.subscriber.stop()
+        if self.workers:
+            self.workers.stop()
+    def push(self, feed, data, headers):
+        # content pushed by a WebSub hub goes through the regular update,
+        # keeping the validators of the last poll
+        headers = dict((key, value) for key, value in headers.iteritems() if key == 'content-type')
+        d = util.parse_data(data, feed.topic, 200, headers)
+        with get_update_lock(feed):
+            etag, modified = feed.etag, feed.modified
             try:
-                feed = jobs.get(False)
-            except Queue.Empty:
-                break
+                items = feed.update(d, self.filters)
+            except Exception, e:
+                logging.info('Failed to process WebSub content for "%s": %s' % (feed.url, e))
+                return []
+            finally:
+                feed.etag, feed.modified = etag, modified
+        items.sort(cmp=cmp_timestamp)
+        return items
+    def group_feeds(self, feeds):
+        groups = {}
+        result = []
+        for feed in feeds:
+            key = feed.fetch_key
+            if key not in groups:
+                groups[key] = []
+                result.append(groups[key])
+            groups[key].append(feed)
+        return result
+    def start_group(self, now, group):
+        # one request for every feed with the same url and credentials,
+        # conditional only when all copies agree on the validators
+        polls = [feed.start_poll(now) for feed in group]
+        url, username, password, etag, modified = polls[0]
+        if any(poll[3:] != (etag, modified) for poll in polls):
+            etag = modified = None
+        digests = set(feed.digest for feed in group)
+        digest = digests.pop() if len(digests) == 1 else None
+        is_known = None
+        if all(feed.id_set for feed in group):
+            is_known = lambda entry: all(feed.is_known(entry) for feed in group)
+        return url, username, password, etag, modified, digest, is_known
+    def get_group_priority(self, group):
+        return max(feed.priority for feed in group)
+    def get_dispatch_priority(self, group):
+        if settings.POLL_ORDER != 'priority':
+            return 0
+        return self.get_group_priority(group)
+    def get_group_max_size(self, group):
+        return max(feed.get_max_size() for feed in group)
+    def get_group_timeouts(self, group, deadline):
+        timeouts = [feed.get_timeouts(deadline) for feed in group]
+        return tuple(max(values) for values in zip(*timeouts))
+    def get_group_limits(self, group):
+        limits = [feed.get_limits() for feed in group]
+        return tuple(max(values) for values in zip(*limits))
+    def update_group(self, group, d):
+        result = []
+        for feed in group:
             try:
-                items = feed.poll(now, self.filters)
+                items = feed.update(d, self.filters)
                 items.sort(cmp=cmp_timestamp)
-                if items and not feed.has_favicon:
-                    feed.download_favicon()
-                results.put(items)
-                jobs.task_done()
-            except Exception:
-                results.put([])
-                jobs.task_done()
+                result.append((feed, items))
+            except Exception, e:
+                feed.fail(e)
+                result.append((feed, []))
+        return result
+    def poll_threads(self, now, feeds, deadline=None):
+        pool = self.get_workers()
+        results = Queue.Queue()
+        logging.info('Submitting %d feeds to worker threads' % len(feeds))
+        count = self.submit_feeds(pool, now, feeds, results, deadline)
+        checked = time.time()
+        while count:
+            try:
+                feed, items = results.get(timeout=1)
+            except Queue.Empty:
+                feed = None
+            if feed:
+                count -= 1
+                yield feed, items
+            # feeds coming due while the cycle runs join it right away, the
+            # cycle deadline bounds how long it keeps taking them
+            if deadline and time.time() - checked >= 1 and time.time() < deadline:
+                checked = time.time()
+                now = int(checked)
+                feeds = self.pop_due(now)
+                if feeds:
+                    logging.info('Submitting %d more feeds to worker threads' % len(feeds))
+                    count += self.submit_feeds(pool, now, feeds, results, deadline)
+        logging.info('Worker threads completed')
+    def submit_feeds(self, pool, now, feeds, results, deadline=None):
+        count = 0
+        for group in self.group_feeds(feeds):
+            priority = self.get_dispatch_priority(group)
+            # route by the url that will be fetched, which may be a learned redirect
+            url = group[0].get_fetch_url(now)
+            if len(group) == 1:
+                submitted = pool.submit(url, priority, self.worker, now, group[0], results, deadline)
+            else:
+                submitted = pool.submit(url, priority, self.group_worker, now, group, results, deadline)
+            if submitted:
+                count += len(group)
+            else:
+                for feed in group:
+                    self.scheduler.schedule(feed)
+        return count
+    def poll_async(self, now, feeds, deadline=None):
+        engine = asyncpoll.Engine(settings.ASYNC_MAX_CONNECTIONS)
+        groups = {}
+        # request deadlines start when a request does, the cycle deadline
+        # only decides whether it may start at all
+        previous = dict((feed, (feed.last_poll, feed.breaker)) for feed in feeds)
+        for group in self.group_feeds(feeds):
+            feed = group[0]
+            priority = self.get_dispatch_priority(group)
+            if len(group) == 1:
+                engine.add(feed, *feed.start_poll(now), max_size=feed.get_max_size(), limits=feed.get_limits(), priority=priority, deadline=deadline)
+                continue
+            url, username, password, etag, modified, digest, is_known = self.start_group(now, group)
+            groups[feed] = (group, digest, is_known)
+            engine.add(feed, url, username, password, etag, modified, self.get_group_max_size(group), self.get_group_limits(group), priority, deadline)
+        logging.info('Starting async poll of %d feeds' % len(feeds))
+        pending = []
+        for feed, response in engine.run():
+            if response.skipped:
+                # never requested, leave the feeds due for the next cycle
+                for member in groups[feed][0] if feed in groups else [feed]:
+                    member.last_poll, member.breaker = previous[member]
+                    logging.info('Skipping feed "%s" after the poll cycle deadline' % member.url)
+                    yield member, []
+                continue
+            if not response.error:
+                for member in groups[feed][0] if feed in groups else [feed]:
+                    member.update_latency(response.elapsed)
+            if feed in groups:
+                group, digest, is_known = groups[feed]
+                for result in self.update_async_group(group, response, digest, is_known):
+                    yield result
+                continue
+            if parsepool.is_enabled() and not response.error:
+                rules, job = parsepool.submit(feed, response.url, response.status, response.headers, response.data, response.redirects, response.transferred, self.filters)
+                pending.append((feed, rules, job))
+                done, pending = self.collect_parsed(pending, False)
+                for result in done:
+                    yield result
+                continue
+            try:
+                items = feed.update(response.parse(feed.digest, feed.get_known()), self.filters)
+                yield self.finish_async(feed, items)
+            except Exception, e:
+                feed.fail(e)
+                yield feed, []
+        done, pending = self.collect_parsed(pending, True)
+        for result in done:
+            yield result
+        logging.info('Async poll completed')
+    def collect_parsed(self, pending, wait):
+        done = []
+        remaining = []
+        for feed, rules, job in pending:
+            if not wait and not job.ready():
+                remaining.append((feed, rules, job))
+                continue
+            try:
+                items = feed.update_records(job.get(), rules)
+                done.append(self.finish_async(feed, items))
+            except Exception, e:
+                feed.fail(e)
+                done.append((feed, []))
+        return done, remaining
+    def update_async_group(self, group, response, digest, is_known):
+        try:
+            d = response.parse(digest, is_known)
+        except Exception, e:
+            for feed in group:
+                feed.fail(e)
+            return [(feed, []) for feed in group]
+        return [self.finish_async(feed, items) for feed, items in self.update_group(group, d)]
+    def finish_async(self, feed, items):
+        items.sort(cmp=cmp_timestamp)
+        if items:
+            feed.download_favicon()
+        return feed, items
+    def skip(self, feeds, results):
+        # the poll cycle ran out of time, leave the feeds due for the next one
+        for feed in feeds:
+            logging.info('Skipping feed "%s" after the poll cycle deadline' % feed.url)
+            results.put((feed, []))
+    def acquire(self, group, deadline=None):
+        # wait for the request budget, higher priority feeds are served first
+        try:
+            ratelimit.acquire_request(self.get_group_priority(group), deadline)
+            return True
+        except socket.timeout:
+            return False
+    def worker(self, now, feed, results, deadline=None):
+        if deadline and time.time() > deadline or not self.acquire([feed], deadline):
+            self.skip([feed], results)
+            return None
+        try:
+            items = feed.poll(now, self.filters, deadline)
+            items.sort(cmp=cmp_timestamp)
+            if items:
+                feed.download_favicon()
+            results.put((feed, items))
+            return True
+        except Exception, e:
+            feed.fail(e)
+            results.put((feed, []))
+            return False
+    def group_worker(self, now, group, results, deadline=None):
+        if deadline and time.time() > deadline or not self.acquire(group, deadline):
+            self.skip(group, results)
+            return None
+        url, username, password, etag, modified, digest, is_known = self.start_group(now, group)
+        timeouts = self.get_group_timeouts(group, deadline)
+        start = time.time()
+        try:
+            d = util.parse(url, username, password, etag, modified, digest, is_known, self.get_group_max_size(group), timeouts, self.get_group_priority(group))
+        except Exception, e:
+            for feed in group:
+                feed.fail(e)
+                results.put((feed, []))
+            return False
+        for feed in group:
+            feed.update_latency(time.time() - start)
+        for feed, items in self.update_group(group, d):
+            if items:
+                feed.download_favicon()
+            results.put((feed, items))
+        return not any(feed.failures for feed in group)
     def purge_items(self, max_age):
         now = int(time.time())
         feeds = set(self.feeds)
@@ -253,6 +774,30 @@ class FeedManager(object):
             'username': None,
             'password': None,
             'color': None,
+            'digest': None,
+            'item_rate': None,
+            'rate_timestamp': 0,
+            'ttl': 0,
+            'skip_hours': set(),
+            'skip_days': set(),
+            'fresh_until': 0,
+            'error_count': 0,
+            'failures': 0,
+            'breaker': BREAKER_CLOSED,
+            'retry_after': 0,
+            'last_error': '',
+            'moved_url': None,
+            'temporary_url': None,
+            'temporary_url_expiry': 0,
+            'max_size': None,
+            'abort_count': 0,
+            'bytes_transferred': 0,
+            'bytes_decoded': 0,
+            'latency': None,
+            'hub': None,
+            'topic': None,
+            'websub_secret': None,
+            'websub_expiry': 0,
         }
         for feed in self.feeds:
             for name, value in attributes.iteritems():
@@ -260,6 +805,7 @@ class FeedManager(object):
                     setattr(feed, name, value)
             if not hasattr(feed, 'id_list'):
                 feed.id_list = list(feed.id_set)
+        self.reschedule()
         logging.info('Loaded %d feeds, %d items, %d filters' % (len(self.feeds), len(self.items), len(self.filters)))
     def save(self, path='feeds.dat'):
         logging.info('Saving feed data to "%s"' % path)
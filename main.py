@@ -28,6 +28,8 @@ def init_logging():
         logging.getLogger('').addHandler(console)
         
 def main():
+    import multiprocessing
+    multiprocessing.freeze_support()
     init_path()
     init_logging()
     import wx
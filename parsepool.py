@@ -0,0 +1,89 @@
+import logging
+import threading
+import multiprocessing
+import feeds
+import filters
+import util
+from settings import settings
+
+lock = threading.Lock()
+pool = None
+
+def is_enabled():
+    return settings.PARSE_PROCESSES > 0
+    
+def get_pool():
+    global pool
+    with lock:
+        if pool is None:
+            logging.info('Starting %d parser processes' % settings.PARSE_PROCESSES)
+            pool = multiprocessing.Pool(settings.PARSE_PROCESSES)
+        return pool
+        
+def close():
+    global pool
+    with lock:
+        if pool is not None:
+            pool.terminate()
+            pool = None
+            
+def parse_job(job):
+    # runs in a worker process, returns a compact picklable record
+    data, url, status, headers, redirects, transferred, digest, known, rules = job
+    is_known = None
+    if known:
+        is_known = lambda entry: feeds.create_id(entry) in known
+    d = util.parse_data(data, url, status, headers, digest, is_known, redirects, transferred)
+    feed = util.get(d, 'feed', None)
+    records = []
+    seen = set()
+    for entry in reversed(util.get(d, 'entries', [])):
+        id = feeds.create_id(entry)
+        if id in known or id in seen:
+            continue
+        seen.add(id)
+        fields = feeds.get_fields(entry)
+        item = feeds.Item(None, id)
+        item.timestamp, item.title, item.description, item.link, item.author = fields
+        results = []
+        for code, ignore_case, whole_word in rules:
+            success = filters.parse(code).evaluate(item, ignore_case, whole_word)
+            results.append(success)
+            if not success:
+                break
+        records.append((id, fields, results))
+    return {
+        'status': status,
+        'href': url,
+        'headers': headers,
+        'redirects': redirects,
+        'transferred': util.get(d, 'transferred', 0),
+        'size': len(data or ''),
+        'etag': util.get(d, 'etag', None),
+        'modified': util.get(d, 'modified', None),
+        'digest': util.get(d, 'digest', None),
+        'hints': util.get_feed_hints(data) if data else None,
+        'feed': bool(feed),
+        'title': util.get(feed, 'title', '') if feed else '',
+        'links': util.get_websub_links(feed, headers),
+        'link': util.get(feed, 'link', '') if feed else '',
+        'records': records,
+    }
+    
+def create_job(feed, url, status, headers, data, redirects, transferred, filters):
+    rules = [filter for filter in filters if filter.applies_to(feed)]
+    codes = [(rule.code, rule.ignore_case, rule.whole_word) for rule in rules]
+    with feeds.get_update_lock(feed):
+        digest, id_set = feed.digest, set(feed.id_set)
+    job = (data, url, status, headers, redirects, transferred, digest, id_set, codes)
+    return job, rules
+    
+def parse(feed, url, status, headers, data, redirects, transferred, filters):
+    job, rules = create_job(feed, url, status, headers, data, redirects, transferred, filters)
+    result = get_pool().apply(parse_job, (job,))
+    return feed.update_records(result, rules)
+    
+def submit(feed, url, status, headers, data, redirects, transferred, filters):
+    job, rules = create_job(feed, url, status, headers, data, redirects, transferred, filters)
+    return rules, get_pool().apply_async(parse_job, (job,))
+    
\ No newline at end of file
@@ -0,0 +1,107 @@
+import time
+import heapq
+import socket
+import itertools
+import threading
+from settings import settings
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.timestamp = time.time()
+        self.condition = threading.Condition()
+        self.waiters = []
+        self.counter = itertools.count()
+    def refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        return now
+    def available(self, amount=1):
+        with self.condition:
+            self.refill()
+            return not self.waiters and self.tokens >= min(amount, self.capacity)
+    def consume(self, amount):
+        # take tokens without waiting, the bucket may go into debt
+        with self.condition:
+            self.refill()
+            self.tokens -= amount
+    def acquire(self, amount, priority=0, deadline=None):
+        # waiters are served highest priority first, then in arrival order
+        needed = min(amount, self.capacity)
+        entry = (-priority, next(self.counter))
+        with self.condition:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = self.refill()
+                    first = self.waiters[0] == entry
+                    if first and self.tokens >= needed:
+                        self.tokens -= amount
+                        return
+                    wait = (needed - self.tokens) / self.rate if first else None
+                    if deadline:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise socket.timeout('Request deadline exceeded waiting for bandwidth')
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.condition.wait(wait)
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+                
+lock = threading.Lock()
+buckets = {}
+
+def get_bucket(name, rate, capacity):
+    # buckets are rebuilt when their settings change
+    with lock:
+        bucket = buckets.get(name)
+        if not rate:
+            buckets.pop(name, None)
+            return None
+        if bucket is None or bucket.rate != rate:
+            bucket = buckets[name] = TokenBucket(rate, capacity)
+        return bucket
+        
+def get_request_bucket():
+    rate = settings.MAX_REQUESTS_PER_MINUTE / 60.0
+    return get_bucket('requests', rate, max(1, rate * settings.RATE_LIMIT_BURST))
+    
+def get_byte_bucket():
+    rate = settings.MAX_BYTES_PER_SECOND
+    return get_bucket('bytes', rate, max(65536, rate * settings.RATE_LIMIT_BURST))
+    
+def acquire_request(priority=0, deadline=None):
+    bucket = get_request_bucket()
+    if bucket:
+        bucket.acquire(1, priority, deadline)
+        
+def acquire_bytes(amount, priority=0, deadline=None):
+    bucket = get_byte_bucket()
+    if bucket:
+        bucket.acquire(amount, priority, deadline)
+        
+# non-blocking variants for the async engine
+
+def request_available():
+    bucket = get_request_bucket()
+    return bucket is None or bucket.available()
+    
+def consume_request():
+    bucket = get_request_bucket()
+    if bucket:
+        bucket.consume(1)
+        
+def bytes_available():
+    bucket = get_byte_bucket()
+    return bucket is None or bucket.available(0)
+    
+def consume_bytes(amount):
+    bucket = get_byte_bucket()
+    if bucket:
+        bucket.consume(amount)
+    
\ No newline at end of file
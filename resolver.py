@@ -0,0 +1,120 @@
+import time
+import socket
+import logging
+import urlparse
+import threading
+import util
+from settings import settings
+
+class Resolver(object):
+    def __init__(self, getaddrinfo):
+        self.getaddrinfo = getaddrinfo
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+    def lookup(self, key):
+        # returns a cached entry or None, the caller must hold the lock
+        entry = self.cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry
+        return None
+    def resolve(self, *args, **kwargs):
+        key = args + tuple(sorted(kwargs.items()))
+        while True:
+            with self.lock:
+                entry = self.lookup(key)
+                if entry:
+                    self.hits += 1
+                    break
+                event = self.pending.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self.pending[key] = threading.Event()
+                    break
+            # another thread is resolving the same name, wait for it
+            event.wait()
+        if not entry:
+            entry = self.update(key, event, args, kwargs)
+        expiry, result, error = entry
+        if error:
+            raise socket.gaierror(*error.args)
+        return list(result)
+    def update(self, key, event, args, kwargs):
+        try:
+            try:
+                result = self.getaddrinfo(*args, **kwargs)
+                entry = (time.time() + settings.DNS_CACHE_TTL, result, None)
+            except socket.gaierror, e:
+                entry = (time.time() + settings.DNS_NEGATIVE_TTL, None, e)
+            with self.lock:
+                if entry[2]:
+                    self.failures += 1
+                if len(self.cache) >= settings.DNS_CACHE_SIZE:
+                    self.prune()
+                self.cache[key] = entry
+            return entry
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+    def prune(self):
+        now = time.time()
+        for key, entry in self.cache.items():
+            if entry[0] <= now:
+                del self.cache[key]
+        if len(self.cache) >= settings.DNS_CACHE_SIZE:
+            self.cache.clear()
+    def missing(self, urls):
+        # lookup keys of the urls that are neither cached nor being resolved
+        keys = set()
+        for url in urls:
+            parts = urlparse.urlsplit(url)
+            if not parts.hostname or parts.scheme not in ('http', 'https'):
+                continue
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            keys.add((parts.hostname, port, 0, socket.SOCK_STREAM))
+        with self.lock:
+            return [key for key in keys if not self.lookup(key) and key not in self.pending]
+    def prefetch(self, keys):
+        for key in keys:
+            try:
+                self.resolve(*key)
+            except Exception:
+                pass
+        if keys:
+            logging.info('Prefetched %d host names' % len(keys))
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'size': len(self.cache),
+            }
+    def log_stats(self):
+        stats = self.stats()
+        logging.info('DNS cache: %(hits)d hits, %(misses)d misses, %(failures)d failures, %(size)d entries' % stats)
+        
+resolver = None
+
+def install():
+    global resolver
+    if resolver is None:
+        logging.info('Installing DNS cache')
+        resolver = Resolver(socket.getaddrinfo)
+        socket.getaddrinfo = resolver.resolve
+    return resolver
+    
+def prefetch(urls):
+    if resolver and settings.DNS_PREFETCH and not settings.USE_PROXY:
+        keys = resolver.missing(urls)
+        if keys:
+            util.start_thread(resolver.prefetch, keys)
+        
+def log_stats():
+    if resolver:
+        resolver.log_stats()
+        
\ No newline at end of file
@@ -0,0 +1,74 @@
+import time
+import heapq
+import itertools
+import threading
+from settings import settings
+
+class Scheduler(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+    def _remove(self, feed):
+        entry = self.entries.pop(feed, None)
+        if entry:
+            entry[-1] = None
+    def _push(self, feed):
+        if not feed.enabled:
+            return
+        due = feed.next_poll
+        if not due and settings.SPREAD_POLLS:
+            # never polled or forced, spread the first polls out a little
+            due = int(time.time() + feed.phase * settings.FIRST_POLL_SPREAD)
+        entry = [due, next(self.counter), feed]
+        self.entries[feed] = entry
+        heapq.heappush(self.heap, entry)
+    def _prune(self):
+        heap = self.heap
+        while heap and heap[0][-1] is None:
+            heapq.heappop(heap)
+    def schedule(self, feed):
+        with self.lock:
+            self._remove(feed)
+            self._push(feed)
+    def remove(self, feed):
+        with self.lock:
+            self._remove(feed)
+    def reset(self, feeds):
+        with self.lock:
+            self.heap = []
+            self.entries = {}
+            for feed in feeds:
+                self._push(feed)
+    def next_due(self):
+        with self.lock:
+            self._prune()
+            return self.heap[0][0] if self.heap else None
+    def peek(self, until, limit=None):
+        # walks only the part of the heap that is due by then
+        result = []
+        with self.lock:
+            heap = self.heap
+            stack = [0]
+            while stack and (limit is None or len(result) < limit):
+                index = stack.pop()
+                if index >= len(heap) or heap[index][0] > until:
+                    continue
+                if heap[index][-1] is not None:
+                    result.append(heap[index][-1])
+                stack.append(2 * index + 2)
+                stack.append(2 * index + 1)
+        return result
+    def pop_due(self, now):
+        result = []
+        with self.lock:
+            heap = self.heap
+            self._prune()
+            while heap and heap[0][0] <= now:
+                due, count, feed = heapq.heappop(heap)
+                del self.entries[feed]
+                result.append(feed)
+                self._prune()
+        return result
+        
\ No newline at end of file
@@ -0,0 +1,123 @@
+import urlparse
+from cStringIO import StringIO
+from xml.etree import cElementTree as ElementTree
+import feedparser
+
+# stop after this many already seen entries in a row
+STOP_RUN = 3
+
+ENTRY_TAGS = set(['item', 'entry'])
+DATE_TAGS = ['updated', 'modified', 'date', 'pubDate', 'published', 'issued']
+HTML_TYPES = ['text/html', 'application/xhtml+xml']
+ID_SCHEMES = ['http', 'https', 'urn', 'tag']
+RDF_ABOUT = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about'
+
+class UnsupportedEntry(Exception):
+    pass
+    
+
+def local_name(tag):
+    if not isinstance(tag, basestring):
+        return ''
+    return tag.rsplit('}', 1)[-1]
+    
+def get_text(element):
+    return ''.join(element.itertext()).strip()
+    
+def get_plain_text(element):
+    # ids are built from feedparser's sanitized values, which only match
+    # the raw text when there is no markup to sanitize
+    if len(element) or element.get('type', 'text') not in ('text', 'text/plain'):
+        raise UnsupportedEntry('Markup in %s' % local_name(element.tag))
+    text = get_text(element)
+    if any(c in text for c in '<>&'):
+        raise UnsupportedEntry('Markup in %s' % local_name(element.tag))
+    return text
+    
+def is_absolute(url):
+    parts = urlparse.urlsplit(url)
+    return parts.scheme in ('http', 'https') and bool(parts.netloc)
+    
+def parse_date(value):
+    func = getattr(feedparser, '_parse_date', None)
+    if not func or not value:
+        return None
+    return func(value)
+    
+def parse_entry(element):
+    values = {}
+    for child in element:
+        name = local_name(child.tag)
+        if name == 'link':
+            href = child.get('href')
+            if href is None:
+                values.setdefault('link', get_text(child))
+            elif child.get('rel', 'alternate') == 'alternate':
+                if child.get('type', 'text/html') not in HTML_TYPES:
+                    raise UnsupportedEntry('Alternate link of another type')
+                values.setdefault('link', href.strip())
+        elif name in ('guid', 'id'):
+            value = get_text(child)
+            if child.get('isPermaLink') != 'false' and urlparse.urlsplit(value).scheme not in ID_SCHEMES:
+                # feedparser resolves these against the feed url
+                raise UnsupportedEntry('Relative entry id')
+            values.setdefault('id', value)
+        elif name in ('author', 'creator'):
+            names = [get_text(x) for x in child if local_name(x.tag) == 'name']
+            values.setdefault('author', names[0] if names else get_text(child))
+        elif name in ('description', 'summary'):
+            values.setdefault('description', get_text(child))
+        elif name in ('content', 'encoded'):
+            values.setdefault('content', get_text(child))
+        elif name == 'title':
+            values.setdefault('title', get_plain_text(child))
+        elif name in DATE_TAGS:
+            values.setdefault(name, get_text(child))
+    if element.get(RDF_ABOUT):
+        # rss 1.0 items, feedparser lets a guid or id element take precedence
+        values.setdefault('id', element.get(RDF_ABOUT))
+    if not is_absolute(values.get('link', '')):
+        # feedparser resolves relative links and falls back to the guid
+        raise UnsupportedEntry('Missing or relative link')
+    entry = {}
+    for key in ['id', 'link', 'title', 'author']:
+        if values.get(key):
+            entry[key] = values[key]
+    description = values.get('description') or values.get('content')
+    if description:
+        entry['description'] = description
+    for name in DATE_TAGS:
+        date_parsed = parse_date(values.get(name))
+        if date_parsed:
+            entry['date_parsed'] = date_parsed
+            break
+    return entry
+    
+def parse(data, is_known):
+    # returns the entries up to a run of known entries and whether
+    # any known entry was found at all
+    entries = []
+    matched = False
+    ordered = True
+    run = 0
+    previous = None
+    for event, element in ElementTree.iterparse(StringIO(data)):
+        if local_name(element.tag) not in ENTRY_TAGS:
+            continue
+        entry = parse_entry(element)
+        element.clear()
+        date_parsed = entry.get('date_parsed')
+        if previous and date_parsed and date_parsed > previous:
+            # entries are not newest first, so we can't stop early
+            ordered = False
+        previous = date_parsed or previous
+        if is_known(entry):
+            matched = True
+            run += 1
+            if ordered and run >= STOP_RUN:
+                break
+        else:
+            run = 0
+        entries.append(entry)
+    return entries, matched
+    
\ No newline at end of file
@@ -1,7 +1,7 @@
 import wx
+import bitmaps
 import controls
 import popups
-import util
 from settings import settings
 
 BACKGROUND = (230, 230, 230)
@@ -119,22 +119,17 @@ class Frame(wx.Frame):
         panel.SetBackgroundColour(wx.Colour(*BACKGROUND))
         panel.SetForegroundColour(wx.BLACK)
         feed = self.item.feed
-        paths = ['icons/feed.png']
-        if feed.has_favicon:
-            paths.insert(0, feed.favicon_path)
-        for path in paths:
-            try:
-                bitmap = util.scale_bitmap(wx.Bitmap(path), 16, 16, wx.Colour(*BACKGROUND))
+        for path in [feed.favicon_path, 'icons/feed.png']:
+            bitmap = bitmaps.get(path, 16, 16, BACKGROUND)
+            if bitmap:
                 break
-            except Exception:
-                pass
         else:
             bitmap = wx.EmptyBitmap(16, 16)
         icon = controls.BitmapLink(panel, feed.link, bitmap)
         icon.SetBackgroundColour(wx.Colour(*BACKGROUND))
         width, height = icon.GetSize()
         feed = self.create_feed(panel, width)
-        button = controls.BitmapLink(panel, popups.COMMAND_CLOSE, wx.Bitmap('icons/cross.png'), wx.Bitmap('icons/cross_hover.png'))
+        button = controls.BitmapLink(panel, popups.COMMAND_CLOSE, bitmaps.get('icons/cross.png'), bitmaps.get('icons/cross_hover.png'))
         button.SetBackgroundColour(wx.Colour(*BACKGROUND))
         sizer = wx.BoxSizer(wx.HORIZONTAL)
         sizer.Add(icon, 0, wx.ALIGN_CENTER|wx.ALL, 10)
@@ -195,16 +190,16 @@ class Frame(wx.Frame):
         panel = wx.Panel(parent, -1)
         panel.SetBackgroundColour(wx.Colour(*BACKGROUND))
         panel.SetForegroundColour(wx.BLACK)
-        first = controls.BitmapLink(panel, popups.COMMAND_FIRST, wx.Bitmap('icons/control_start.png'), wx.Bitmap('icons/control_start_blue.png'))
-        previous = controls.BitmapLink(panel, popups.COMMAND_PREVIOUS, wx.Bitmap('icons/control_rewind.png'), wx.Bitmap('icons/control_rewind_blue.png'))
+        first = controls.BitmapLink(panel, popups.COMMAND_FIRST, bitmaps.get('icons/control_start.png'), bitmaps.get('icons/control_start_blue.png'))
+        previous = controls.BitmapLink(panel, popups.COMMAND_PREVIOUS, bitmaps.get('icons/control_rewind.png'), bitmaps.get('icons/control_rewind_blue.png'))
         text = '%s of %s' % (self.context['item_index'], self.context['item_count'])
         text = controls.Text(panel, 0, text)
         text.SetBackgroundColour(wx.Colour(*BACKGROUND))
         text.fit_no_wrap()
-        next = controls.BitmapLink(panel, popups.COMMAND_NEXT, wx.Bitmap('icons/control_fastforward.png'), wx.Bitmap('icons/control_fastforward_blue.png'))
-        last = controls.BitmapLink(panel, popups.COMMAND_LAST, wx.Bitmap('icons/control_end.png'), wx.Bitmap('icons/control_end_blue.png'))
-        play = controls.BitmapLink(panel, popups.COMMAND_PLAY, wx.Bitmap('icons/control_play.png'), wx.Bitmap('icons/control_play_blue.png'))
-        pause = controls.BitmapLink(panel, popups.COMMAND_PAUSE, wx.Bitmap('icons/control_pause.png'), wx.Bitmap('icons/control_pause_blue.png'))
+        next = controls.BitmapLink(panel, popups.COMMAND_NEXT, bitmaps.get('icons/control_fastforward.png'), bitmaps.get('icons/control_fastforward_blue.png'))
+        last = controls.BitmapLink(panel, popups.COMMAND_LAST, bitmaps.get('icons/control_end.png'), bitmaps.get('icons/control_end_blue.png'))
+        play = controls.BitmapLink(panel, popups.COMMAND_PLAY, bitmaps.get('icons/control_play.png'), bitmaps.get('icons/control_play_blue.png'))
+        pause = controls.BitmapLink(panel, popups.COMMAND_PAUSE, bitmaps.get('icons/control_pause.png'), bitmaps.get('icons/control_pause_blue.png'))
         widgets = [first, previous, next, last, play, pause]
         self.bind_links(widgets)
         for widget in widgets:
@@ -2,15 +2,30 @@ import wx
 import os
 import re
 import time
+import zlib
+import socket
 import base64
+import hashlib
 import calendar
+import email.utils
 import urllib2
 import urlparse
 import threading
 import feedparser
+import connections
+import streaming
+import ratelimit
 from htmlentitydefs import name2codepoint
 from settings import settings
 
+try:
+    import brotli
+    # a tiny brotli body can expand to gigabytes, only bindings that can
+    # cap their output (Brotli 1.1+) are safe to advertise
+    brotli.Decompressor().process('', output_buffer_limit=1)
+except Exception:
+    brotli = None
+
 def set_icon(window):
     bundle = wx.IconBundle()
     bundle.AddIcon(wx.Icon('icons/16.png', wx.BITMAP_TYPE_PNG))
@@ -76,12 +91,256 @@ def abspath(path):
     path = 'file:///%s' % path.replace('\\', '/')
     return path
     
-def parse(url, username=None, password=None, etag=None, modified=None):
-    agent = settings.USER_AGENT
-    handlers = [get_proxy()]
+class ResponseTooLarge(IOError):
+    pass
+    
+def check_size(size, max_size):
+    if max_size and size > max_size:
+        raise ResponseTooLarge('Response larger than %d bytes' % max_size)
+        
+def get_default_limits():
+    # (connect timeout, read timeout, total time allowed per request)
+    return settings.CONNECT_TIMEOUT, settings.READ_TIMEOUT, settings.REQUEST_TIMEOUT
+    
+def get_default_timeouts():
+    # (connect timeout, read timeout, absolute deadline)
+    connect, read, total = get_default_limits()
+    return connect, read, time.time() + total
+    
+def check_deadline(deadline):
+    if deadline and time.time() > deadline:
+        raise socket.timeout('Request deadline exceeded')
+        
+def iter_chunks(f, max_size=None, deadline=None, chunk_size=8192, priority=None):
+    # read in chunks so an oversized or endless body is cut off early,
+    # throttled by the bandwidth budget when a priority is given
+    headers = f.info() if hasattr(f, 'info') else f.msg
+    length = headers.get('content-length', '').strip()
+    if length.isdigit():
+        check_size(int(length), max_size)
+    size = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        check_size(size, max_size)
+        check_deadline(deadline)
+        if priority is not None:
+            ratelimit.acquire_bytes(len(chunk), priority, deadline)
+        yield chunk
+        
+def read_limited(f, max_size=None, deadline=None, chunk_size=8192, priority=None):
+    return ''.join(iter_chunks(f, max_size, deadline, chunk_size, priority))
+    
+def get_accept_encoding():
+    if brotli:
+        return 'gzip, deflate, br'
+    return 'gzip, deflate'
+    
+class Decoder(object):
+    def __init__(self, encoding, max_size=None):
+        self.encoding = encoding if encoding in ('gzip', 'deflate', 'br') else None
+        self.max_size = max_size
+        self.size = 0
+        self.decompressor = None
+    def create(self, data):
+        if self.encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.encoding == 'deflate':
+            # some servers send raw deflate data without the zlib header
+            header = len(data) >= 2 and ord(data[0]) & 0x0f == 8 and (ord(data[0]) * 256 + ord(data[1])) % 31 == 0
+            return zlib.decompressobj(zlib.MAX_WBITS if header else -zlib.MAX_WBITS)
+        if brotli is None:
+            raise IOError('Brotli content encoding is not supported')
+        return brotli.Decompressor()
+    def decompress(self, data):
+        if not self.encoding:
+            result = data
+        elif not data:
+            return ''
+        else:
+            if self.decompressor is None:
+                self.decompressor = self.create(data)
+            if self.encoding == 'br':
+                result = self.decompress_brotli(data)
+            elif self.max_size:
+                result = self.decompressor.decompress(data, self.max_size - self.size + 1)
+            else:
+                result = self.decompressor.decompress(data)
+        self.size += len(result)
+        check_size(self.size, self.max_size)
+        return result
+    def decompress_brotli(self, data):
+        # a small brotli chunk can expand enormously, so check the size
+        # while decoding rather than after
+        if not self.max_size:
+            return self.decompressor.process(data)
+        result = []
+        size = self.size
+        while True:
+            output = self.decompressor.process(data, output_buffer_limit=self.max_size - size + 1)
+            data = ''
+            size += len(output)
+            check_size(size, self.max_size)
+            result.append(output)
+            if self.decompressor.can_accept_more_data():
+                return ''.join(result)
+    def flush(self):
+        if self.decompressor is None or self.encoding == 'br':
+            return ''
+        result = self.decompressor.flush()
+        self.size += len(result)
+        check_size(self.size, self.max_size)
+        return result
+        
+def decompress(data, encoding, max_size=None):
+    decoder = Decoder(encoding, max_size)
+    return decoder.decompress(data) + decoder.flush()
+    
+def read_body(f, encoding, max_size=None, deadline=None, priority=None):
+    # returns the decoded body and the number of bytes on the wire
+    decoder = Decoder(encoding, max_size)
+    chunks = []
+    transferred = 0
+    for chunk in iter_chunks(f, max_size, deadline, priority=priority):
+        transferred += len(chunk)
+        chunks.append(decoder.decompress(chunk))
+    chunks.append(decoder.flush())
+    return ''.join(chunks), transferred
+    
+class RedirectHandler(urllib2.HTTPRedirectHandler):
+    # records (status, url, expiry) for every redirect that is followed
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        method_code = 307 if code == 308 else code
+        result = urllib2.HTTPRedirectHandler.redirect_request(self, req, fp, method_code, msg, headers, newurl)
+        if result is not None:
+            headers = dict((key.lower(), value) for key, value in headers.items())
+            expiry = get_header_expiry(code, headers, int(time.time()))
+            result.redirects = getattr(req, 'redirects', [])
+            result.redirects.append((code, newurl, expiry))
+            for name in ['max_size', 'connect_timeout', 'read_timeout', 'deadline', 'priority']:
+                setattr(result, name, getattr(req, name, None))
+        return result
+    http_error_308 = urllib2.HTTPRedirectHandler.http_error_302
+    
+def fetch(url, username=None, password=None, etag=None, modified=None, max_size=None, timeouts=None, priority=0):
+    max_size = max_size or settings.MAX_RESPONSE_SIZE
+    connect_timeout, read_timeout, deadline = timeouts or get_default_timeouts()
+    request = urllib2.Request(url)
+    request.redirects = []
+    request.max_size = max_size
+    request.connect_timeout = connect_timeout
+    request.read_timeout = read_timeout
+    request.deadline = deadline
+    request.priority = priority
+    request.add_header('User-Agent', settings.USER_AGENT)
+    request.add_header('Accept-Encoding', get_accept_encoding())
+    request.add_header('A-IM', 'feed')
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if modified:
+        request.add_header('If-Modified-Since', modified)
+    handlers = [get_proxy(), RedirectHandler()]
+    if settings.USE_CONNECTION_POOL:
+        handlers.append(connections.get_handler())
     if username and password:
-        url = insert_credentials(url, username, password)
-    return feedparser.parse(url, etag=etag, modified=modified, agent=agent, handlers=handlers)
+        credentials = base64.b64encode('%s:%s' % (username, password))
+        request.add_header('Authorization', 'Basic %s' % credentials)
+        manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
+        manager.add_password(None, url, username, password)
+        handlers.append(urllib2.HTTPDigestAuthHandler(manager))
+    opener = urllib2.build_opener(*handlers)
+    try:
+        # handlers other than the pooled one use a single socket timeout
+        f = opener.open(request, timeout=read_timeout)
+    except urllib2.HTTPError, e:
+        f = e
+    try:
+        headers = dict((key.lower(), value) for key, value in f.info().items())
+        encoding = headers.pop('content-encoding', '').lower()
+        # the pooled handler has already read the body off the wire
+        throttle = None if settings.USE_CONNECTION_POOL else priority
+        data, transferred = read_body(f, encoding, max_size, deadline, throttle)
+        status = f.code or 200
+        url = f.geturl()
+    finally:
+        f.close()
+    return status, url, headers, data, request.redirects, transferred
+    
+def is_http(url):
+    return urlparse.urlsplit(url).scheme in ('http', 'https')
+    
+def parse(url, username=None, password=None, etag=None, modified=None, digest=None, is_known=None, max_size=None, timeouts=None, priority=0):
+    if not is_http(url):
+        return feedparser.parse(url, agent=settings.USER_AGENT)
+    status, url, headers, data, redirects, transferred = fetch(url, username, password, etag, modified, max_size, timeouts, priority)
+    return parse_data(data, url, status, headers, digest, is_known, redirects, transferred)
+    
+def get_digest(data):
+    return hashlib.sha1(data).hexdigest() if data else None
+    
+def parse_streaming(data, is_known):
+    # only trust the streaming parser when it found entries we already
+    # know about, otherwise fall back to a full feedparser parse
+    try:
+        entries, matched = streaming.parse(data, is_known)
+    except Exception:
+        return None
+    if not matched:
+        return None
+    d = feedparser.FeedParserDict()
+    d['feed'] = feedparser.FeedParserDict()
+    d['entries'] = entries
+    return d
+    
+def parse_data(data, url, status=200, headers=None, digest=None, is_known=None, redirects=None, transferred=None):
+    headers = headers or {}
+    new_digest = get_digest(data)
+    unchanged = status == 304 or (digest and status == 200 and new_digest == digest)
+    d = None
+    if unchanged:
+        # not modified, skip the expensive parse
+        d = feedparser.FeedParserDict()
+        d['feed'] = feedparser.FeedParserDict()
+        d['entries'] = []
+    elif is_known and settings.STREAMING_PARSER and status == 200:
+        d = parse_streaming(data, is_known)
+    if d is None:
+        # relative links resolve against the url the body came from
+        response_headers = dict(headers)
+        response_headers['content-location'] = urlparse.urljoin(url, headers.get('content-location', ''))
+        d = feedparser.parse(data, response_headers=response_headers)
+    d['status'] = status
+    d['href'] = url
+    d['headers'] = headers
+    d['data'] = data
+    d['digest'] = new_digest
+    d['unchanged'] = bool(unchanged)
+    d['redirects'] = redirects or []
+    d['transferred'] = len(data or '') if transferred is None else transferred
+    if 'etag' in headers:
+        d['etag'] = headers['etag']
+    if 'last-modified' in headers:
+        d['modified'] = headers['last-modified']
+    return d
+    
+def get_websub_links(feed, headers):
+    # returns (hub, topic), link headers take precedence over the feed
+    hub = topic = None
+    for url, rel in re.findall(r'<([^>]*)>[^,]*?rel\s*=\s*"?([^";,]+)', headers.get('link', '')):
+        rels = rel.lower().split()
+        if 'hub' in rels and not hub:
+            hub = url
+        if 'self' in rels and not topic:
+            topic = url
+    for link in get(feed or {}, 'links', []):
+        rel = link.get('rel', '')
+        if rel == 'hub' and not hub:
+            hub = link.get('href')
+        elif rel == 'self' and not topic:
+            topic = link.get('href')
+    return hub, topic
     
 def is_valid_feed(data):
     entries = get(data, 'entries', [])
@@ -89,15 +348,78 @@ def is_valid_feed(data):
     link = get(data.feed, 'link', '')
     return entries or title or link
     
-def insert_credentials(url, username, password):
-    parts = urlparse.urlsplit(url)
-    netloc = parts.netloc
-    if '@' in netloc:
-        netloc = netloc[netloc.index('@')+1:]
-    netloc = '%s:%s@%s' % (username, password, netloc)
-    parts = list(parts)
-    parts[1] = netloc
-    return urlparse.urlunsplit(tuple(parts))
+def parse_http_date(value):
+    parsed = email.utils.parsedate_tz(value)
+    if not parsed:
+        return None
+    return int(email.utils.mktime_tz(parsed))
+    
+def parse_delay(value, now):
+    value = value.strip()
+    if value.isdigit():
+        return now + int(value)
+    return parse_http_date(value) or 0
+    
+def get_header_expiry(status, headers, now):
+    result = 0
+    if status in (429, 503) and 'retry-after' in headers:
+        result = max(result, parse_delay(headers['retry-after'], now))
+    cache_control = headers.get('cache-control', '').lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return result
+    match = re.search(r'max-age\s*=\s*(\d+)', cache_control)
+    if match:
+        age = headers.get('age', '0').strip()
+        age = int(age) if age.isdigit() else 0
+        result = max(result, now + int(match.group(1)) - age)
+    elif 'expires' in headers:
+        result = max(result, parse_http_date(headers['expires']) or 0)
+    return result
+    
+SYNDICATION_PERIODS = {
+    'hourly': 60 * 60,
+    'daily': 60 * 60 * 24,
+    'weekly': 60 * 60 * 24 * 7,
+    'monthly': 60 * 60 * 24 * 30,
+    'yearly': 60 * 60 * 24 * 365,
+}
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def get_feed_hints(data):
+    # only look at channel level elements
+    match = re.search(r'<(?:\w+:)?(?:item|entry)[\s>]', data)
+    if match:
+        data = data[:match.start()]
+    ttl = 0
+    match = re.search(r'<ttl>\s*(\d+)\s*</ttl>', data, re.I)
+    if match:
+        ttl = int(match.group(1)) * 60
+    match = re.search(r'<(?:\w+:)?updatePeriod>\s*(\w+)\s*<', data)
+    if match and match.group(1).lower() in SYNDICATION_PERIODS:
+        period = SYNDICATION_PERIODS[match.group(1).lower()]
+        match = re.search(r'<(?:\w+:)?updateFrequency>\s*(\d+)\s*<', data)
+        frequency = int(match.group(1)) if match else 1
+        ttl = max(ttl, period / max(frequency, 1))
+    hours = set()
+    match = re.search(r'<skipHours>(.*?)</skipHours>', data, re.I|re.S)
+    if match:
+        hours = set(int(hour) % 24 for hour in re.findall(r'<hour>\s*(\d+)\s*</hour>', match.group(1), re.I))
+    days = set()
+    match = re.search(r'<skipDays>(.*?)</skipDays>', data, re.I|re.S)
+    if match:
+        days = set(day.capitalize() for day in re.findall(r'<day>\s*(\w+)\s*</day>', match.group(1), re.I))
+    return ttl, hours, days
+    
+def skip_times(timestamp, hours, days):
+    if not hours and not days:
+        return timestamp
+    for i in range(24 * 7):
+        t = time.gmtime(timestamp)
+        if t.tm_hour not in hours and DAY_NAMES[t.tm_wday] not in days:
+            break
+        timestamp = timestamp - timestamp % 3600 + 3600
+    return timestamp
     
 def encode_password(password):
     return base64.b64encode(password) if password else None
@@ -170,6 +492,31 @@ def guess_polling_interval(entries):
         interval = max(choice for choice in choices if choice <= desired)
     return interval
     
+def adaptive_polling_interval(rate):
+    low = settings.ADAPTIVE_MIN_INTERVAL
+    high = settings.ADAPTIVE_MAX_INTERVAL
+    if rate <= 0:
+        return high
+    desired = 0.5 / rate
+    return int(min(max(desired, low), high))
+    
+def get_fraction(*keys):
+    # stable pseudo random number in [0, 1) for the given keys
+    value = hashlib.md5(':'.join(str(key) for key in keys)).hexdigest()
+    return int(value[:8], 16) / float(0x100000000)
+    
+def align_to_phase(due, interval, phase):
+    # move due to the nearest time that is phase * interval into an
+    # interval-sized slot, so feeds with equal intervals spread out
+    if interval <= 0:
+        return due
+    offset = phase * interval
+    return offset + round((due - offset) / float(interval)) * interval
+    
+def get_jitter(interval, *keys):
+    limit = min(settings.POLL_JITTER, interval * settings.POLL_JITTER_FRACTION)
+    return (get_fraction(*keys) * 2 - 1) * limit
+    
 def time_since(t):
     t = int(t)
     now = int(time.time())
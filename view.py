@@ -10,6 +10,8 @@ INDEX_TITLE = 2
 INDEX_INTERVAL = 3
 INDEX_ITEM_COUNT = 4
 INDEX_CLICKS = 5
+INDEX_ERRORS = 6
+INDEX_ABORTS = 7
 
 INDEX_RULES = 1
 INDEX_FEEDS = 2
@@ -193,9 +195,15 @@ class AddFeedDialog(wx.Dialog):
         self.url.SelectAll()
         self.url.SetFocus()
     def check_feed(self, url, username=None, password=None):
-        d = util.parse(url, username, password)
+        try:
+            d = util.parse(url, username, password)
+        except Exception:
+            d = None
         if not self: # cancelled
             return
+        if d is None:
+            wx.CallAfter(self.on_invalid)
+            return
         status = util.get(d, 'status', 0)
         if status == 401: # auth required
             wx.CallAfter(self.on_password, url, username, password)
@@ -293,8 +301,8 @@ class EditFeedDialog(wx.Dialog):
         return panel
     def create_controls(self, parent):
         sizer = wx.GridBagSizer(8, 8)
-        indexes = [0, 1, 3, 5, 7]
-        labels = ['Feed URL', 'Feed Title', 'Feed Link', 'Polling Interval', 'Border Color']
+        indexes = [0, 1, 3, 5, 7, 9]
+        labels = ['Feed URL', 'Feed Title', 'Feed Link', 'Polling Interval', 'Border Color', 'Maximum Size']
         for index, text in zip(indexes, labels):
             label = wx.StaticText(parent, -1, text)
             font = label.GetFont()
@@ -302,7 +310,7 @@ class EditFeedDialog(wx.Dialog):
             label.SetFont(font)
             sizer.Add(label, (index, 0), flag=wx.ALIGN_CENTER_VERTICAL|wx.ALIGN_RIGHT)
         controls = []
-        for index in indexes[:-2]:
+        for index in indexes[:-3]:
             style = wx.TE_READONLY if index == 0 else 0
             control = wx.TextCtrl(parent, -1, '', size=(300, -1), style=style)
             control.Bind(wx.EVT_TEXT, self.on_text)
@@ -334,6 +342,9 @@ class EditFeedDialog(wx.Dialog):
         self.default = default = wx.Button(parent, -1, 'Use Default')
         default.Bind(wx.EVT_BUTTON, self.on_default)
         sizer.Add(default, (7, 2))
+        self.max_size = max_size = wx.SpinCtrl(parent, -1, str((self.feed.max_size or 0) / 1024), min=0, max=1024*100, size=(64, -1))
+        sizer.Add(max_size, (9, 1))
+        sizer.Add(wx.StaticText(parent, -1, 'KB'), (9, 2), flag=wx.ALIGN_CENTER_VERTICAL)
         label = wx.StaticText(parent, -1, 'The feed title will be shown in the pop-up window for items from this feed.')
         label.Wrap(300)
         sizer.Add(label, (2, 1), (1, 2), flag=wx.ALIGN_CENTER_VERTICAL)
@@ -346,6 +357,9 @@ class EditFeedDialog(wx.Dialog):
         label = wx.StaticText(parent, -1, 'The color specifies the border color of pop-up windows for this feed, if you want to override the default.')
         label.Wrap(300)
         sizer.Add(label, (8, 1), (1, 2), flag=wx.ALIGN_CENTER_VERTICAL)
+        label = wx.StaticText(parent, -1, 'Downloads larger than the maximum size are aborted. Use 0 for the default of %d KB.' % (settings.MAX_RESPONSE_SIZE / 1024))
+        label.Wrap(300)
+        sizer.Add(label, (10, 1), (1, 2), flag=wx.ALIGN_CENTER_VERTICAL)
         return sizer
     def create_add_buttons(self, parent):
         sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -413,6 +427,7 @@ class EditFeedDialog(wx.Dialog):
         self.feed.link = link
         self.feed.interval = interval
         self.feed.color = self.color._color
+        self.feed.max_size = int(self.max_size.GetValue()) * 1024 or None
         self.EndModal(wx.ID_OK)
         
 class EditFilterDialog(wx.Dialog):
@@ -567,6 +582,7 @@ class Model(object):
         self.apply_filters()
         self.apply_feeds()
         self.apply_settings()
+        self.controller.manager.reschedule()
         self.controller.save()
     def apply_settings(self):
         for key, value in self.settings.items():
@@ -624,8 +640,12 @@ class Model(object):
             return cmp(b.clicks, a.clicks)
         def cmp_item_count(a, b):
             return cmp(b.item_count, a.item_count)
+        def cmp_errors(a, b):
+            return cmp(b.error_count, a.error_count)
+        def cmp_aborts(a, b):
+            return cmp(b.abort_count, a.abort_count)
         def cmp_interval(a, b):
-            return cmp(a.interval, b.interval)
+            return cmp(a.effective_interval, b.effective_interval)
         def cmp_title(a, b):
             return cmp(a.title.lower(), b.title.lower())
         def cmp_url(a, b):
@@ -637,6 +657,8 @@ class Model(object):
             INDEX_INTERVAL: cmp_interval,
             INDEX_CLICKS: cmp_clicks,
             INDEX_ITEM_COUNT: cmp_item_count,
+            INDEX_ERRORS: cmp_errors,
+            INDEX_ABORTS: cmp_aborts,
         }
         self.feeds.sort(cmp=funcs[column])
         if column == self._feed_sort:
@@ -762,6 +784,8 @@ class FeedsList(wx.ListCtrl):
         self.InsertColumn(INDEX_INTERVAL, 'Interval')
         self.InsertColumn(INDEX_ITEM_COUNT, 'Items')
         self.InsertColumn(INDEX_CLICKS, 'Clicks')
+        self.InsertColumn(INDEX_ERRORS, 'Errors')
+        self.InsertColumn(INDEX_ABORTS, 'Aborts')
         self.Bind(wx.EVT_LEFT_DOWN, self.on_left_down)
         self.Bind(wx.EVT_LIST_COL_CLICK, self.on_col_click)
         self.update()
@@ -771,6 +795,8 @@ class FeedsList(wx.ListCtrl):
         self.SetColumnWidth(INDEX_INTERVAL, 75)
         self.SetColumnWidth(INDEX_ITEM_COUNT, -2)
         self.SetColumnWidth(INDEX_CLICKS, -2)
+        self.SetColumnWidth(INDEX_ERRORS, -2)
+        self.SetColumnWidth(INDEX_ABORTS, -2)
     def update(self):
         self.SetItemCount(len(self.model.feeds))
         self.Refresh()
@@ -798,11 +824,17 @@ class FeedsList(wx.ListCtrl):
         if column == INDEX_TITLE:
             return feed.title
         if column == INDEX_INTERVAL:
-            return util.split_time_str(feed.interval)
+            return util.split_time_str(feed.effective_interval)
         if column == INDEX_CLICKS:
             return str(feed.clicks) if feed.clicks else ''
         if column == INDEX_ITEM_COUNT:
             return str(feed.item_count) if feed.item_count else ''
+        if column == INDEX_ERRORS:
+            if feed.breaker != feeds.BREAKER_CLOSED:
+                return '%d (%s)' % (feed.error_count, feeds.BREAKER_STR[feed.breaker])
+            return str(feed.error_count) if feed.error_count else ''
+        if column == INDEX_ABORTS:
+            return str(feed.abort_count) if feed.abort_count else ''
         return ''
         
 class FiltersList(wx.ListCtrl):
@@ -1287,16 +1319,21 @@ class OptionsPanel(wx.Panel):
         check_now = wx.Button(parent, -1, 'Check Now')
         grid.Add(check_now, (1, 1), flag=wx.ALIGN_CENTER_VERTICAL)
         
+        adaptive = wx.CheckBox(parent, -1, 'Adjust polling intervals to how often feeds update')
+        grid.Add(adaptive, (2, 0), (1, 3), flag=wx.ALIGN_CENTER_VERTICAL)
+        
         sizer.Add(grid, 1, wx.EXPAND|wx.ALL, 8)
         
         timeout.Bind(wx.EVT_SPINCTRL, self.on_change)
         idle.Bind(wx.EVT_CHECKBOX, self.on_change)
         auto_update.Bind(wx.EVT_CHECKBOX, self.on_change)
+        adaptive.Bind(wx.EVT_CHECKBOX, self.on_change)
         check_now.Bind(wx.EVT_BUTTON, self.on_check_now)
         
         self.idle = idle
         self.timeout = timeout
         self.auto_update = auto_update
+        self.adaptive = adaptive
         self.check_now = check_now
         return sizer
     def create_caching(self, parent):
@@ -1360,6 +1397,7 @@ class OptionsPanel(wx.Panel):
         self.idle.SetValue(model.DISABLE_WHEN_IDLE)
         self.timeout.SetValue(model.USER_IDLE_TIMEOUT)
         self.auto_update.SetValue(model.CHECK_FOR_UPDATES)
+        self.adaptive.SetValue(model.ADAPTIVE_POLLING)
         one_day = 60 * 60 * 24
         self.item.SetValue(model.ITEM_CACHE_AGE / one_day)
         self.use_proxy.SetValue(model.USE_PROXY)
@@ -1370,6 +1408,7 @@ class OptionsPanel(wx.Panel):
         model.DISABLE_WHEN_IDLE = self.idle.GetValue()
         model.USER_IDLE_TIMEOUT = self.timeout.GetValue()
         model.CHECK_FOR_UPDATES = self.auto_update.GetValue()
+        model.ADAPTIVE_POLLING = self.adaptive.GetValue()
         one_day = 60 * 60 * 24
         model.ITEM_CACHE_AGE = self.item.GetValue() * one_day
         model.USE_PROXY = self.use_proxy.GetValue()
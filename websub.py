@@ -0,0 +1,198 @@
+import hmac
+import time
+import uuid
+import socket
+import urllib
+import urllib2
+import hashlib
+import logging
+import urlparse
+import threading
+import SocketServer
+import BaseHTTPServer
+import util
+from settings import settings
+
+ALGORITHMS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha384': hashlib.sha384,
+    'sha512': hashlib.sha512,
+}
+
+def check_signature(secret, signature, body):
+    method, separator, value = signature.partition('=')
+    algorithm = ALGORITHMS.get(method.strip().lower())
+    if not separator or algorithm is None:
+        return False
+    expected = hmac.new(secret, body, algorithm).hexdigest()
+    return hmac.compare_digest(expected, value.strip().lower())
+    
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def get_id(self):
+        return urlparse.urlsplit(self.path).path.strip('/')
+    def respond(self, status, body=''):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_GET(self):
+        # verification of intent from the hub
+        query = dict(urlparse.parse_qsl(urlparse.urlsplit(self.path).query))
+        challenge = self.server.subscriber.verify(self.get_id(), query)
+        if challenge is None:
+            self.respond(404)
+        else:
+            self.respond(200, challenge)
+    def do_POST(self):
+        # content distribution from the hub
+        length = self.headers.get('content-length', '').strip()
+        if not length.isdigit():
+            self.respond(411)
+            return
+        if int(length) > settings.MAX_RESPONSE_SIZE:
+            self.respond(413)
+            return
+        body = self.rfile.read(int(length))
+        headers = dict((key.lower(), value) for key, value in self.headers.items())
+        if self.server.subscriber.receive(self.get_id(), headers, body):
+            self.respond(202)
+        else:
+            self.respond(404)
+    def log_message(self, format, *args):
+        logging.info('WebSub callback: %s' % (format % args))
+        
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    
+class Subscriber(object):
+    def __init__(self, manager, callback):
+        self.manager = manager
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.maintaining = threading.Lock()
+        self.pending = {}
+        self.requested = {}
+        self.removed = {}
+        self.server = None
+    def start(self):
+        address = (settings.WEBSUB_HOST, settings.WEBSUB_PORT)
+        self.server = Server(address, Handler)
+        self.server.subscriber = self
+        util.start_thread(self.server.serve_forever)
+        logging.info('WebSub callback server listening on port %d' % self.server.server_address[1])
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    def get_callback_url(self, feed):
+        base = settings.WEBSUB_CALLBACK_URL
+        if not base:
+            host = settings.WEBSUB_HOST or socket.getfqdn()
+            base = 'http://%s:%d/' % (host, self.server.server_address[1])
+        if not base.endswith('/'):
+            base += '/'
+        return urlparse.urljoin(base, feed.uuid)
+    def find_feed(self, id):
+        for feed in list(self.manager.feeds):
+            if feed.uuid == id:
+                return feed
+        with self.lock:
+            return self.removed.get(id)
+    def request(self, feed, mode):
+        data = {
+            'hub.mode': mode,
+            'hub.topic': feed.topic,
+            'hub.callback': self.get_callback_url(feed),
+        }
+        if mode == 'subscribe':
+            feed.websub_secret = feed.websub_secret or uuid.uuid4().hex
+            data['hub.lease_seconds'] = str(settings.WEBSUB_LEASE)
+            data['hub.secret'] = feed.websub_secret
+        with self.lock:
+            self.pending[(feed.uuid, mode)] = feed.topic
+            self.requested[feed.uuid] = time.time()
+        try:
+            opener = urllib2.build_opener(util.get_proxy())
+            f = opener.open(feed.hub, urllib.urlencode(data), settings.READ_TIMEOUT)
+            f.close()
+        except Exception, e:
+            logging.info('WebSub %s for "%s" failed: %s' % (mode, feed.url, e))
+            with self.lock:
+                self.pending.pop((feed.uuid, mode), None)
+            return False
+        logging.info('Requested WebSub %s for "%s" at "%s"' % (mode, feed.topic, feed.hub))
+        return True
+    def verify(self, id, query):
+        mode = query.get('hub.mode')
+        topic = query.get('hub.topic')
+        feed = self.find_feed(id)
+        if feed is None:
+            return None
+        if mode == 'denied':
+            logging.info('WebSub subscription for "%s" was denied: %s' % (feed.url, query.get('hub.reason', '')))
+            feed.websub_expiry = 0
+            self.manager.scheduler.schedule(feed)
+            return ''
+        challenge = query.get('hub.challenge')
+        with self.lock:
+            expected = self.pending.get((id, mode))
+            if challenge is None or expected is None or expected != topic:
+                return None
+            del self.pending[(id, mode)]
+        if mode == 'subscribe':
+            lease = query.get('hub.lease_seconds', '')
+            lease = int(lease) if lease.isdigit() else settings.WEBSUB_LEASE
+            feed.websub_expiry = int(time.time()) + lease
+            logging.info('WebSub subscription for "%s" verified for %s' % (feed.url, util.split_time_str(lease)))
+        else:
+            feed.websub_expiry = 0
+            with self.lock:
+                self.removed.pop(id, None)
+            logging.info('WebSub unsubscription for "%s" verified' % feed.url)
+        self.manager.scheduler.schedule(feed)
+        return challenge
+    def receive(self, id, headers, body):
+        feed = self.find_feed(id)
+        if feed is None or feed.uuid in self.removed or not feed.websub_secret:
+            return False
+        signature = headers.get('x-hub-signature', '')
+        if not check_signature(feed.websub_secret, signature, body):
+            # acknowledge but ignore, as the spec asks
+            logging.info('Ignoring WebSub content for "%s" with a bad signature' % feed.url)
+            return True
+        logging.info('Received WebSub content for "%s"' % feed.url)
+        items = self.manager.push(feed, body, headers)
+        if items:
+            self.callback(items)
+        return True
+    def maintain(self, feeds):
+        # subscribe new hubs, renew leases before they run out and drop
+        # subscriptions of disabled feeds, skipped while a previous run is
+        # still waiting on its hubs
+        if not self.maintaining.acquire(False):
+            return
+        try:
+            now = time.time()
+            for feed in feeds:
+                if not feed.hub or not feed.topic:
+                    continue
+                with self.lock:
+                    recent = now - self.requested.get(feed.uuid, 0) < settings.WEBSUB_RETRY_INTERVAL
+                if recent:
+                    continue
+                if not feed.enabled:
+                    if feed.websub_expiry > now:
+                        self.request(feed, 'unsubscribe')
+                elif feed.websub_expiry - now < settings.WEBSUB_RENEW_MARGIN:
+                    self.request(feed, 'subscribe')
+        finally:
+            self.maintaining.release()
+    def unsubscribe(self, feed):
+        if feed.hub and feed.topic and feed.websub_expiry > time.time():
+            with self.lock:
+                self.removed[feed.uuid] = feed
+            util.start_thread(self.request, feed, 'unsubscribe')
+            
\ No newline at end of file
@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+import dispatch
+from settings import settings
+
+class WorkerPool(object):
+    def __init__(self, size):
+        self.size = size
+        self.jobs = dispatch.HostQueue(maxsize=settings.WORKER_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.threads = []
+        self.busy = 0
+        self.completed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_wait = 0.0
+        self.window = [0, 0, 0.0, 0]
+        self.baseline = None
+    def start(self):
+        count = 0
+        with self.lock:
+            while len(self.threads) < self.size:
+                thread = threading.Thread(target=self.worker)
+                thread.setDaemon(True)
+                thread.start()
+                self.threads.append(thread)
+                count += 1
+        if count:
+            logging.info('Started %d worker threads' % count)
+    def resize(self, size):
+        with self.lock:
+            self.size = size
+        self.start()
+    def retire(self, force=False):
+        with self.lock:
+            if not force and len(self.threads) <= self.size:
+                return False
+            self.threads.remove(threading.currentThread())
+            return True
+    def submit(self, url, priority, func, *args):
+        result = self.jobs.put(url, (time.time(), func, args), priority)
+        with self.lock:
+            self.window[3] = max(self.window[3], len(self.jobs))
+        return result
+    def worker(self):
+        while not self.retire():
+            host, job = self.jobs.get(persistent=True)
+            if job is None:
+                self.retire(True)
+                break
+            queued, func, args = job
+            start = time.time()
+            with self.lock:
+                self.busy += 1
+            error = False
+            try:
+                error = func(*args) is False
+            except Exception:
+                error = True
+                logging.exception('Worker job failed')
+            finally:
+                end = time.time()
+                self.jobs.done(host)
+                with self.lock:
+                    self.busy -= 1
+                    self.completed += 1
+                    self.errors += error
+                    self.total_latency += end - start
+                    self.max_latency = max(self.max_latency, end - start)
+                    self.total_wait += start - queued
+                    self.window[0] += 1
+                    self.window[1] += error
+                    self.window[2] += end - start
+            if settings.AUTOTUNE_WORKERS:
+                self.tune()
+    def tune(self):
+        # additive increase while jobs back up, multiplicative decrease
+        # when fetches start failing or slowing down
+        with self.lock:
+            count, errors, latency, backlog = self.window
+            if count < settings.AUTOTUNE_WINDOW:
+                return
+            self.window = [0, 0, 0.0, 0]
+            latency /= count
+            error_rate = float(errors) / count
+            baseline = self.baseline
+            if baseline is None or latency < baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - baseline) * 0.1
+            size = self.size
+            if error_rate > settings.AUTOTUNE_MAX_ERROR_RATE:
+                size = size / 2
+                reason = 'error rate %d%%' % (error_rate * 100)
+            elif baseline and latency > baseline * settings.AUTOTUNE_LATENCY_FACTOR:
+                size = size / 2
+                reason = 'latency %.2fs, baseline %.2fs' % (latency, baseline)
+            elif backlog:
+                size = size + 1
+                reason = 'backlog of %d jobs' % backlog
+            else:
+                return
+            size = max(settings.AUTOTUNE_MIN_WORKERS, min(settings.AUTOTUNE_MAX_WORKERS, size))
+            if size == self.size:
+                return
+            logging.info('Autotune: %d -> %d worker threads (%s)' % (self.size, size, reason))
+        self.resize(size)
+    def stop(self, timeout=None):
+        # drop queued jobs and let running jobs finish their writes
+        logging.info('Stopping worker threads')
+        self.jobs.close()
+        with self.lock:
+            threads = list(self.threads)
+        deadline = time.time() + (settings.WORKER_SHUTDOWN_TIMEOUT if timeout is None else timeout)
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+        with self.lock:
+            remaining = len(self.threads)
+        if remaining:
+            logging.warning('%d worker threads still running at shutdown' % remaining)
+        return not remaining
+    def stats(self):
+        with self.lock:
+            completed = self.completed
+            return {
+                'workers': len(self.threads),
+                'busy': self.busy,
+                'queued': len(self.jobs),
+                'completed': completed,
+                'errors': self.errors,
+                'latency': self.total_latency / completed if completed else 0.0,
+                'max_latency': self.max_latency,
+                'wait': self.total_wait / completed if completed else 0.0,
+            }
+    def log_stats(self):
+        stats = self.stats()
+        logging.info('Worker pool: %(workers)d workers, %(busy)d busy, %(queued)d queued, %(completed)d completed, %(errors)d errors, %(latency).2fs avg latency, %(max_latency).2fs max latency, %(wait).2fs avg wait' % stats)
+        
\ No newline at end of file